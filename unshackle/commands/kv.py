@@ -8,7 +8,7 @@ import click
 from unshackle.core.config import config
 from unshackle.core.constants import context_settings
 from unshackle.core.services import Services
-from unshackle.core.vault import Vault
+from unshackle.core.vault import Vault, is_null_key
 from unshackle.core.vaults import Vaults
 
 
@@ -30,20 +30,20 @@ def _load_vaults(vault_names: list[str]) -> Vaults:
     return vaults
 
 
-def _process_service_keys(from_vault: Vault, service: str, log: logging.Logger) -> dict[str, str]:
-    """Get and validate keys from a vault for a specific service."""
-    content_keys = list(from_vault.get_keys(service))
-
-    bad_keys = {kid: key for kid, key in content_keys if not key or key.count("0") == len(key)}
+def _process_service_keys(content_keys: list[tuple[str, str]], log: logging.Logger) -> dict[str, str]:
+    """Validate keys read from a vault for a specific service."""
+    bad_keys = {kid: key for kid, key in content_keys if is_null_key(key)}
     for kid, key in bad_keys.items():
         log.warning(f"Skipping NULL key: {kid}:{key}")
 
     return {kid: key for kid, key in content_keys if kid not in bad_keys}
 
 
-def _copy_service_data(to_vault: Vault, from_vault: Vault, service: str, log: logging.Logger) -> int:
+def _copy_service_data(
+    to_vault: Vault, from_vault: Vault, service: str, service_keys: list[tuple[str, str]], log: logging.Logger
+) -> int:
     """Copy data for a single service between vaults."""
-    content_keys = _process_service_keys(from_vault, service, log)
+    content_keys = _process_service_keys(service_keys, log)
     total_count = len(content_keys)
 
     if total_count == 0:
@@ -111,8 +111,8 @@ def copy(to_vault_name: str, from_vault_names: list[str], service: Optional[str]
     for from_vault in from_vaults:
         services_to_copy = [service] if service else from_vault.get_services()
 
-        for service_tag in services_to_copy:
-            added = _copy_service_data(to_vault, from_vault, service_tag, log)
+        for service_tag, service_keys in from_vault.get_all_keys(services_to_copy):
+            added = _copy_service_data(to_vault, from_vault, service_tag, service_keys, log)
             total_added += added
 
     if total_added > 0:
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import base64
+import json
+import re
 import secrets
 from typing import Any, Dict, List, Optional, Union
 from uuid import UUID
@@ -13,6 +15,9 @@ from requests import Session
 from unshackle.core import __version__
 from unshackle.core.vaults import Vaults
 
+# kid/key pairs inside cached keys that were sent as a JSON-encoded string
+CACHED_KEY_RE = re.compile(r'"kid"\s*:\s*"([0-9a-fA-F-]+)"\s*,\s*"key"\s*:\s*"([0-9a-fA-F]+)"')
+
 
 class MockCertificateChain:
     """Mock certificate chain for PlayReady compatibility."""
@@ -701,11 +706,11 @@ class DecryptLabsRemoteCDM:
 
         return keys
 
-    def _parse_cached_keys(self, cached_keys_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _parse_cached_keys(self, cached_keys_data: Union[List[Dict[str, Any]], str]) -> List[Dict[str, Any]]:
         """Parse cached keys from API response.
 
         Args:
-            cached_keys_data: List of cached key objects from API
+            cached_keys_data: List of cached key objects from API, or that list as a JSON string
 
         Returns:
             List of key dictionaries
@@ -713,6 +718,13 @@ class DecryptLabsRemoteCDM:
         keys = []
 
         try:
+            if cached_keys_data and isinstance(cached_keys_data, str):
+                # Only the kid/key pairs are needed, pick them out instead of decoding the whole document
+                pairs = CACHED_KEY_RE.findall(cached_keys_data)
+                if pairs and len(pairs) == cached_keys_data.count('"kid"'):
+                    return [{"kid": kid, "key": key, "type": "CONTENT"} for kid, key in pairs]
+                # Objects in another shape (field order, extra fields, escapes), decode the document instead
+                cached_keys_data = json.loads(cached_keys_data)
             if cached_keys_data and isinstance(cached_keys_data, list):
                 for key_data in cached_keys_data:
                     if "kid" in key_data and "key" in key_data:
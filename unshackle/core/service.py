@@ -127,6 +127,8 @@ class Service(metaclass=ABCMeta):
             "https://",
             HTTPAdapter(
                 max_retries=Retry(total=15, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504]),
+                pool_connections=32,
+                pool_maxsize=32,
                 pool_block=True,
             ),
         )
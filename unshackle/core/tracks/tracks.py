@@ -151,8 +151,10 @@ class Tracks:
             tracks = [*list(tracks), *tracks.chapters, *tracks.attachments]
 
         duplicates = 0
+        # Track IDs seen so far, kept up to date so bulk adds don't rescan every track per addition
+        existing_ids = {x.id for x in self}
         for track in flatten(tracks):
-            if self.exists(by_id=track.id):
+            if track.id and track.id in existing_ids:
                 if not warn_only:
                     raise ValueError(
                         "One or more of the provided Tracks is a duplicate. "
@@ -167,10 +169,13 @@ class Tracks:
 
             if isinstance(track, Video):
                 self.videos.append(track)
+                existing_ids.add(track.id)
             elif isinstance(track, Audio):
                 self.audio.append(track)
+                existing_ids.add(track.id)
             elif isinstance(track, Subtitle):
                 self.subtitles.append(track)
+                existing_ids.add(track.id)
             elif isinstance(track, Chapter):
                 self.chapters.add(track)
             elif isinstance(track, Attachment):
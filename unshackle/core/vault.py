@@ -1,9 +1,22 @@
 from abc import ABCMeta, abstractmethod
-from typing import Iterator, Optional, Union
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional, Union
 from uuid import UUID
 
+# Placeholder key some sources return for a KID they have no key for
+NULL_KEY = "0" * 32
+
+
+def is_null_key(key: Optional[str]) -> bool:
+    """Check if a Content Key is missing or all zeroes, stopping at the first non-zero digit."""
+    return not key or not key.lstrip("0")
+
 
 class Vault(metaclass=ABCMeta):
+    # Services read at once by get_all_keys, vaults safe to read from several threads may raise it
+    READ_WORKERS = 1
+
     def __init__(self, name: str, no_push: bool = False):
         self.name = name
         self.no_push = no_push
@@ -29,6 +42,34 @@ class Vault(metaclass=ABCMeta):
     def get_keys(self, service: str) -> Iterator[tuple[str, str]]:
         """Get All Keys from Vault by Service."""
 
+    def get_all_keys(self, services: Iterable[str]) -> Iterator[tuple[str, list[tuple[str, str]]]]:
+        """Get All Keys from Vault for each Service, yielding every Service with its keys in order."""
+        if self.READ_WORKERS <= 1:
+            for service in services:
+                yield service, list(self.get_keys(service))
+            return
+
+        # read the Services first, a lazy listing may use the connection of the thread iterating it
+        services = iter(list(services))
+        with ThreadPoolExecutor(max_workers=self.READ_WORKERS) as pool:
+            # only READ_WORKERS Services are read ahead, so at most that many key lists wait in memory
+            pending = deque()
+
+            def submit(service: str) -> None:
+                pending.append((service, pool.submit(lambda: list(self.get_keys(service)))))
+
+            for service in services:
+                submit(service)
+                if len(pending) == self.READ_WORKERS:
+                    break
+            while pending:
+                service, future = pending.popleft()
+                keys = future.result()
+                next_service = next(services, None)
+                if next_service is not None:
+                    submit(next_service)
+                yield service, keys
+
     @abstractmethod
     def add_key(self, service: str, kid: Union[UUID, str], key: str) -> bool:
         """Add KID:KEY to the Vault."""
@@ -46,4 +87,4 @@ class Vault(metaclass=ABCMeta):
         """Get a list of Service Tags from Vault."""
 
 
-__all__ = ("Vault",)
+__all__ = ("Vault", "NULL_KEY", "is_null_key")
@@ -3,7 +3,7 @@ from uuid import UUID
 
 from unshackle.core.config import config
 from unshackle.core.utilities import import_module_by_path
-from unshackle.core.vault import Vault
+from unshackle.core.vault import Vault, is_null_key
 
 _VAULTS = sorted(
     (path for path in config.directories.vaults.glob("*.py") if path.stem.lower() != "__init__"), key=lambda x: x.stem
@@ -49,7 +49,7 @@ class Vaults:
         """Get Key from the first Vault it can by KID (Key ID) and Service."""
         for vault in self.vaults:
             key = vault.get_key(kid, self.service)
-            if key and key.count("0") != len(key):
+            if not is_null_key(key):
                 return key, vault
         return None, None
 
@@ -2,5 +2,7 @@ import jsonpickle
 
 
 class MSLObject:
+    __slots__ = ()
+
     def __repr__(self):
         return "<{} {}>".format(self.__class__.__name__, jsonpickle.encode(self, unpicklable=False))
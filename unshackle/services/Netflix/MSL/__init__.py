@@ -6,6 +6,7 @@ import os
 import random
 import re
 import sys
+import threading
 import time
 import zlib
 from datetime import datetime
@@ -32,6 +33,8 @@ from .schemes.DiffieHellman import DiffieHellman
 
 class MSL:
     log = logging.getLogger("MSL")
+    # Scrubs the " (E3-...)" error code suffix from error details
+    ERROR_CODE_RE = re.compile(r" \(E3-[^)]+\)")
 
     def __init__(self, session, endpoint, sender, keys, message_id, user_auth=None):
         self.session = session
@@ -40,6 +43,8 @@ class MSL:
         self.keys = keys
         self.user_auth = user_auth
         self.message_id = message_id
+        # Serializes message id allocation and encryption, requests themselves may run concurrently
+        self._lock = threading.Lock()
 
     @classmethod
     def handshake(cls, scheme: KeyExchangeSchemes, session: requests.Session, endpoint: str, sender: str, cache: Cacher, kenc: Optional[bytes] = None, khmac: Optional[bytes] = None):
@@ -105,7 +110,7 @@ class MSL:
             except requests.HTTPError as e:
                 raise cls.log.exit(f"- Key exchange failed, response data is unexpected: {e.response.text}")
 
-            key_exchange = r.json()  # expecting no payloads, so this is fine
+            key_exchange = json.loads(r.content)  # expecting no payloads, so this is fine
             if "errordata" in key_exchange:
                 message = "- Key exchange failed: " + json.loads(base64.b64decode(
                     key_exchange["errordata"]
@@ -129,7 +134,10 @@ class MSL:
                 try:
                     # Decode the response public key
                     response_public_bytes = base64.b64decode(key_data["publickey"])
-                    response_public_key = DiffieHellman.decode_public_key(response_public_bytes)
+                    response_public_key = DiffieHellman.decode_public_key(
+                        response_public_bytes,
+                        parameters=dh_request._private_key.parameters()
+                    )
                     
                     # Complete the key exchange
                     shared_secret = dh_request._private_key.exchange(response_public_key)
@@ -291,9 +299,10 @@ class MSL:
         return None
 
     def send_message(self, endpoint, params, application_data, userauthdata=None):
-        message = self.create_message(application_data, userauthdata)
+        with self._lock:
+            message = self.create_message(application_data, userauthdata)
         res = self.session.post(url=endpoint, data=message, params=params)
-        header, payload_data = self.parse_message(res.text)
+        header, payload_data = self.parse_message(res.content)
         if "errordata" in header:
             raise self.log.exit(
                 "- MSL response message contains an error: {}".format(
@@ -341,12 +350,12 @@ class MSL:
         :param payload_chunks: List of payload chunks
         :return: json object
         """
-        raw_data = ""
+        raw_data = []
 
         for payload_chunk in payload_chunks:
             # todo ; verify signature of payload_chunk["signature"] against payload_chunk["payload"]
             # expecting base64-encoded json string
-            payload_chunk = json.loads(base64.b64decode(payload_chunk["payload"]).decode("utf-8"))
+            payload_chunk = json.loads(base64.b64decode(payload_chunk["payload"]))
             # decrypt the payload
             payload_decrypted = AES.new(
                 key=self.keys.encryption,
@@ -354,18 +363,18 @@ class MSL:
                 iv=base64.b64decode(payload_chunk["iv"])
             ).decrypt(base64.b64decode(payload_chunk["ciphertext"]))
             payload_decrypted = Padding.unpad(payload_decrypted, 16)
-            payload_decrypted = json.loads(payload_decrypted.decode("utf-8"))
+            payload_decrypted = json.loads(payload_decrypted)
             # decode and uncompress data if compressed
             payload_data = base64.b64decode(payload_decrypted["data"])
             if payload_decrypted.get("compressionalgo") == "GZIP":
                 payload_data = zlib.decompress(payload_data, 16 + zlib.MAX_WBITS)
-            raw_data += payload_data.decode("utf-8")
+            raw_data.append(payload_data)
 
-        data = json.loads(raw_data)
+        data = json.loads(b"".join(raw_data))
         if "error" in data:
             error = data["error"]
             error_display = error.get("display")
-            error_detail = re.sub(r" \(E3-[^)]+\)", "", error.get("detail", ""))
+            error_detail = self.ERROR_CODE_RE.sub("", error.get("detail", ""))
 
             if error_display:
                self.log.critical(f"- {error_display}")
@@ -383,10 +392,12 @@ class MSL:
         """
         Parse an MSL message into a header and list of payload chunks
 
-        :param message: MSL message
+        :param message: MSL message, as text or the raw response body
         :returns: a 2-item tuple containing message and list of payload chunks if available
         """
-        parsed_message = json.loads("[{}]".format(message.replace("}{", "},{")))
+        if isinstance(message, str):
+            message = message.encode("utf-8")
+        parsed_message = json.loads(b"[" + message.replace(b"}{", b"},{") + b"]")
 
         header = parsed_message[0]
         encrypted_payload_chunks = parsed_message[1:] if len(parsed_message) > 1 else []
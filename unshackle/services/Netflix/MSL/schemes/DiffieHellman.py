@@ -1,9 +1,10 @@
-import base64
 import hashlib
 import hmac
 import json
 import os
-from typing import Tuple, Optional
+import threading
+from binascii import a2b_base64, b2a_base64
+from typing import Tuple, Optional, Union
 
 from cryptography.hazmat.primitives.asymmetric import dh
 from cryptography.hazmat.primitives import hashes, serialization
@@ -14,6 +15,18 @@ from .. import KeyExchangeSchemes
 from ..MSLObject import MSLObject
 
 
+AES_BLOCK_SIZE = 16
+# PKCS#7 padding for every possible pad length, indexed by length - 1
+_PKCS7_PADS = tuple(bytes([i]) * i for i in range(1, AES_BLOCK_SIZE + 1))
+
+
+def _to_bytes(data: Union[str, bytes, bytearray]) -> Union[bytes, bytearray]:
+    """Get the UTF-8 bytes of a message, passing through data that is already binary."""
+    if isinstance(data, (bytes, bytearray)):
+        return data
+    return data.encode('utf-8')
+
+
 # noinspection PyPep8Naming
 class DiffieHellman(MSLObject):
     """
@@ -22,24 +35,48 @@ class DiffieHellman(MSLObject):
     This implementation follows the Netflix MSL specification for the "DH" key exchange scheme,
     providing perfect forward secrecy and secure session key derivation.
     """
+
+    __slots__ = (
+        "scheme",
+        "keydata",
+        "_private_key",
+        "_public_key",
+        "_encoded_public_key",
+        "_shared_secret",
+        "_kenc",
+        "_khmac",
+        "_hmac_template",
+        "_aes_algorithm",
+    )
     
     # Standardized 2048-bit MODP group parameters (RFC 3526, Group 14)
-    P = int("FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD1"
-            "29024E088A67CC74020BBEA63B139B22514A08798E3404DD"
-            "EF9519B3CD3A431B302B0A6DF25F14374FE1356D6D51C245"
-            "E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED"
-            "EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE45B3D"
-            "C2007CB8A163BF0598DA48361C55D39A69163FA8FD24CF5F"
-            "83655D23DCA3AD961C62F356208552BB9ED529077096966D"
-            "670C354E4ABC9804F1746C08CA18217C32905E462E36CE3B"
-            "E39E772C180E86039B2783A2EC07A28FB5C55DF06F4C52C9"
-            "DE2BCBF6955817183995497CEA956AE515D2261898FA0510"
-            "15728E5A8AACAA68FFFFFFFFFFFFFFFF", 16)
+    P_BYTES = bytes.fromhex(
+        "FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD1"
+        "29024E088A67CC74020BBEA63B139B22514A08798E3404DD"
+        "EF9519B3CD3A431B302B0A6DF25F14374FE1356D6D51C245"
+        "E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED"
+        "EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE45B3D"
+        "C2007CB8A163BF0598DA48361C55D39A69163FA8FD24CF5F"
+        "83655D23DCA3AD961C62F356208552BB9ED529077096966D"
+        "670C354E4ABC9804F1746C08CA18217C32905E462E36CE3B"
+        "E39E772C180E86039B2783A2EC07A28FB5C55DF06F4C52C9"
+        "DE2BCBF6955817183995497CEA956AE515D2261898FA0510"
+        "15728E5A8AACAA68FFFFFFFFFFFFFFFF")
+    P = int.from_bytes(P_BYTES, byteorder='big')
     G = 2
     
     # Key sizes
     KENC_SIZE = 16  # 16 bytes for AES-128-CBC
     KHMAC_SIZE = 32  # 32 bytes for HMAC-SHA256
+    SIGNATURE_SIZE = 32  # 32 bytes for a SHA-256 digest
+
+    # Random bytes drawn from os.urandom in bulk and sliced into IVs
+    IV_POOL_SIZE = 4096
+    _iv_pool = b''
+    _iv_offset = 0
+    _iv_lock = threading.Lock()
+
+    _parameters: Optional[dh.DHParameters] = None
     
     def __init__(self, scheme: KeyExchangeSchemes, keydata: dict):
         """
@@ -52,20 +89,37 @@ class DiffieHellman(MSLObject):
         self.keydata = keydata
         self._private_key = None
         self._public_key = None
+        self._encoded_public_key = None
         self._shared_secret = None
         self._kenc = None
         self._khmac = None
+        self._hmac_template = None
+        self._aes_algorithm = None
         
+    @property
+    def public_key_b64(self) -> Optional[str]:
+        """
+        Get our public key in MSL byte array format, Base64 encoded, as sent in the keydata.
+
+        :return: Base64 encoded public key or None if no key pair was generated
+        """
+        if self._encoded_public_key is None:
+            return None
+        return self.keydata["publickey"]
+
     @classmethod
     def generate_parameters(cls) -> dh.DHParameters:
         """
         Generate standardized DH parameters.
+
+        The group is fixed, so the parameters object is built once and shared.
         
         :return: DH parameters object
         """
-        # Create parameters from standardized values
-        parameters = dh.DHParameterNumbers(cls.P, cls.G).parameters(default_backend())
-        return parameters
+        if cls._parameters is None:
+            # Create parameters from standardized values
+            cls._parameters = dh.DHParameterNumbers(cls.P, cls.G).parameters(default_backend())
+        return cls._parameters
     
     @classmethod
     def generate_key_pair(cls) -> Tuple[dh.DHPrivateKey, dh.DHPublicKey]:
@@ -98,25 +152,18 @@ class DiffieHellman(MSLObject):
         public_numbers = public_key.public_numbers()
         y = public_numbers.y
         
-        # Convert to bytes in big-endian format
-        key_bytes = y.to_bytes((y.bit_length() + 7) // 8, byteorder='big')
-        
-        # Ensure we have at least one sign bit (add zero byte if MSB is set)
-        if key_bytes and (key_bytes[0] & 0x80):
-            key_bytes = b'\x00' + key_bytes
-        
-        # Ensure exactly one zero byte in the zeroth element
-        if not key_bytes or key_bytes[0] != 0:
-            key_bytes = b'\x00' + key_bytes
-            
-        return key_bytes
+        # Minimal big-endian bytes never start with a zero byte, so a single zero byte
+        # prefix gives both the sign bit and exactly one zero byte in the zeroth element
+        return b'\x00' + y.to_bytes((y.bit_length() + 7) // 8, byteorder='big')
     
     @classmethod
-    def decode_public_key(cls, key_bytes: bytes) -> dh.DHPublicKey:
+    def decode_public_key(cls, key_bytes: bytes, parameters: Optional[dh.DHParameters] = None) -> dh.DHPublicKey:
         """
         Decode public key from MSL byte array format.
         
         :param key_bytes: Encoded public key bytes
+        :param parameters: DH parameters the key belongs to, e.g. from our own private key (default is
+            the standardized group)
         :return: DH public key object
         :raises ValueError: If key bytes are invalid
         """
@@ -124,17 +171,11 @@ class DiffieHellman(MSLObject):
         if not key_bytes or key_bytes[0] != 0:
             raise ValueError("Invalid public key encoding: missing zero byte at position 0")
         
-        # Remove leading zero byte for conversion
-        if len(key_bytes) > 1:
-            y_bytes = key_bytes[1:]
-        else:
-            y_bytes = b'\x00'  # Handle zero value case
-            
-        # Convert bytes to integer
-        y = int.from_bytes(y_bytes, byteorder='big')
-        
-        # Create public key from parameters and y value
-        parameters = cls.generate_parameters()
+        # Convert bytes after the leading zero byte to integer without copying the slice
+        y = int.from_bytes(memoryview(key_bytes)[1:], byteorder='big')
+
+        # Create public key from parameter numbers and y value
+        parameters = parameters or cls.generate_parameters()
         public_numbers = dh.DHPublicNumbers(y, parameters.parameter_numbers())
         public_key = public_numbers.public_key(default_backend())
         
@@ -166,13 +207,14 @@ class DiffieHellman(MSLObject):
             scheme=KeyExchangeSchemes.DiffieHellman,
             keydata={
                 "parametersid": parametersid,
-                "publickey": base64.b64encode(encoded_public_key).decode('utf-8')
+                "publickey": b2a_base64(encoded_public_key, newline=False).decode('ascii')
             }
         )
         
         # Store private key for key exchange completion
         request._private_key = private_key
         request._public_key = public_key
+        request._encoded_public_key = encoded_public_key
         
         return request
     
@@ -197,8 +239,11 @@ class DiffieHellman(MSLObject):
             
         # Decode request public key
         try:
-            request_public_bytes = base64.b64decode(request.keydata["publickey"])
-            request_public_key = cls.decode_public_key(request_public_bytes)
+            request_public_bytes = a2b_base64(request.keydata["publickey"])
+            request_public_key = cls.decode_public_key(
+                request_public_bytes,
+                parameters=request._private_key.parameters() if request._private_key else None
+            )
         except Exception as e:
             raise ValueError(f"Invalid public key in request: {str(e)}")
         
@@ -216,13 +261,14 @@ class DiffieHellman(MSLObject):
             scheme=KeyExchangeSchemes.DiffieHellman,
             keydata={
                 "parametersid": request.keydata["parametersid"],
-                "publickey": base64.b64encode(encoded_public_key).decode('utf-8')
+                "publickey": b2a_base64(encoded_public_key, newline=False).decode('ascii')
             }
         )
         
         # Store private key and shared secret for key derivation
         response._private_key = private_key
         response._public_key = public_key
+        response._encoded_public_key = encoded_public_key
         response._shared_secret = shared_secret
         
         return response
@@ -242,11 +288,12 @@ class DiffieHellman(MSLObject):
         if self._shared_secret is None:
             raise ValueError("Shared secret not available. Perform key exchange first.")
         
-        # Convert shared secret to MSL byte array format
-        shared_secret_bytes = self._convert_to_msl_byte_array(self._shared_secret)
-        
-        # Hash with SHA-384
-        hash_bytes = hashlib.sha384(shared_secret_bytes).digest()
+        # Hash the shared secret in MSL byte array format with SHA-384. The MSL format is the
+        # value without leading zero bytes behind exactly one zero byte (a zero value is [0x00]),
+        # so feed the zero byte and the value separately instead of concatenating a copy
+        hash_obj = hashlib.sha384(b'\x00')
+        hash_obj.update(self._shared_secret.lstrip(b'\x00'))
+        hash_bytes = hash_obj.digest()
         
         # Derive keys
         kenc = hash_bytes[:self.KENC_SIZE]
@@ -255,26 +302,29 @@ class DiffieHellman(MSLObject):
         # Store derived keys
         self._kenc = kenc
         self._khmac = khmac
+
+        # Key the HMAC once, each signature continues from a copy of this state
+        self._hmac_template = hmac.new(khmac, digestmod=hashlib.sha256)
+        # Validate the AES key once, each message only needs a new CBC mode for its IV
+        self._aes_algorithm = algorithms.AES(kenc)
         
         return kenc, khmac
     
-    def _convert_to_msl_byte_array(self, data: bytes) -> bytes:
+    @classmethod
+    def _next_iv(cls) -> bytes:
         """
-        Convert byte data to MSL byte array format.
-        
-        For zero shared secret value, must be represented as single-byte array [0x00]
-        
-        :param data: Input byte data
-        :return: MSL formatted byte array
+        Take the next 16 byte IV from the shared random pool, refilling it when exhausted.
+
+        :return: Random 16 byte IV
         """
-        if not data or all(b == 0 for b in data):
-            return b'\x00'
-        
-        # Remove leading zero bytes but ensure at least one zero byte at position 0
-        # This is a simplified implementation - in practice, we need to follow
-        # Java BigInteger.toByteArray() behavior exactly
-        return b'\x00' + data
-    
+        with cls._iv_lock:
+            if cls._iv_offset + 16 > len(cls._iv_pool):
+                cls._iv_pool = os.urandom(cls.IV_POOL_SIZE)
+                cls._iv_offset = 0
+            iv = cls._iv_pool[cls._iv_offset:cls._iv_offset + 16]
+            cls._iv_offset += 16
+        return iv
+
     def get_derived_keys(self) -> Tuple[Optional[bytes], Optional[bytes]]:
         """
         Get the derived keys if available.
@@ -283,11 +333,22 @@ class DiffieHellman(MSLObject):
         """
         return self._kenc, self._khmac
     
-    def encrypt_message(self, plaintext: str) -> dict:
+    def _aes_cbc(self, iv: bytes) -> Cipher:
+        """
+        Create an AES-128-CBC cipher for the given IV using the derived Kenc key.
+
+        :param iv: 16 byte IV
+        :return: Cipher object
+        """
+        if self._aes_algorithm is None:
+            self._aes_algorithm = algorithms.AES(self._kenc)
+        return Cipher(self._aes_algorithm, modes.CBC(iv), backend=default_backend())
+
+    def encrypt_message(self, plaintext: Union[str, bytes]) -> dict:
         """
         Encrypt a message using AES-128-CBC with the derived Kenc key.
         
-        :param plaintext: Message to encrypt
+        :param plaintext: Message to encrypt, as text or UTF-8 bytes
         :return: Encrypted message data dictionary
         :raises ValueError: If keys not derived
         """
@@ -295,21 +356,21 @@ class DiffieHellman(MSLObject):
             raise ValueError("Encryption key not available. Derive keys first.")
         
         # Generate random IV
-        iv = os.urandom(16)
+        iv = self._next_iv()
         
         # Pad plaintext to block size
-        plaintext_bytes = plaintext.encode('utf-8')
-        padding_length = 16 - (len(plaintext_bytes) % 16)
-        padded_plaintext = plaintext_bytes + bytes([padding_length] * padding_length)
+        plaintext_bytes = _to_bytes(plaintext)
+        padding_length = AES_BLOCK_SIZE - (len(plaintext_bytes) % AES_BLOCK_SIZE)
+        padded_plaintext = plaintext_bytes + _PKCS7_PADS[padding_length - 1]
         
         # Encrypt
-        cipher = Cipher(algorithms.AES(self._kenc), modes.CBC(iv), backend=default_backend())
+        cipher = self._aes_cbc(iv)
         encryptor = cipher.encryptor()
         ciphertext = encryptor.update(padded_plaintext) + encryptor.finalize()
         
         return {
-            "ciphertext": base64.b64encode(ciphertext).decode('utf-8'),
-            "iv": base64.b64encode(iv).decode('utf-8')
+            "ciphertext": b2a_base64(ciphertext, newline=False).decode('ascii'),
+            "iv": b2a_base64(iv, newline=False).decode('ascii')
         }
     
     def decrypt_message(self, encrypted_data: dict) -> str:
@@ -325,13 +386,13 @@ class DiffieHellman(MSLObject):
         
         # Decode data
         try:
-            ciphertext = base64.b64decode(encrypted_data["ciphertext"])
-            iv = base64.b64decode(encrypted_data["iv"])
+            ciphertext = a2b_base64(encrypted_data["ciphertext"])
+            iv = a2b_base64(encrypted_data["iv"])
         except Exception as e:
             raise ValueError(f"Invalid encrypted data: {str(e)}")
         
         # Decrypt
-        cipher = Cipher(algorithms.AES(self._kenc), modes.CBC(iv), backend=default_backend())
+        cipher = self._aes_cbc(iv)
         decryptor = cipher.decryptor()
         padded_plaintext = decryptor.update(ciphertext) + decryptor.finalize()
         
@@ -340,31 +401,44 @@ class DiffieHellman(MSLObject):
             raise ValueError("Invalid padding")
         
         padding_length = padded_plaintext[-1]
-        if padding_length > 16 or padding_length == 0:
+        if padding_length > AES_BLOCK_SIZE or padding_length == 0:
             raise ValueError("Invalid padding")
         
         plaintext = padded_plaintext[:-padding_length]
         return plaintext.decode('utf-8')
     
-    def create_hmac(self, message: str) -> str:
+    def _hmac_digest(self, message: Union[str, bytes]) -> bytes:
+        """
+        Compute the HMAC-SHA256 digest of a message from a copy of the pre-keyed HMAC state.
+
+        :param message: Message to sign, as text or UTF-8 bytes
+        :return: Raw HMAC signature
+        """
+        if self._hmac_template is None:
+            self._hmac_template = hmac.new(self._khmac, digestmod=hashlib.sha256)
+        h = self._hmac_template.copy()
+        h.update(_to_bytes(message))
+        return h.digest()
+
+    def create_hmac(self, message: Union[str, bytes]) -> str:
         """
         Create HMAC-SHA256 signature using the derived Khmac key.
         
-        :param message: Message to sign
+        :param message: Message to sign, as text or UTF-8 bytes
         :return: Base64 encoded HMAC signature
         :raises ValueError: If keys not derived
         """
         if self._khmac is None:
             raise ValueError("HMAC key not available. Derive keys first.")
         
-        signature = hmac.new(self._khmac, message.encode('utf-8'), hashlib.sha256).digest()
-        return base64.b64encode(signature).decode('utf-8')
+        signature = self._hmac_digest(message)
+        return b2a_base64(signature, newline=False).decode('ascii')
     
-    def verify_hmac(self, message: str, signature: str) -> bool:
+    def verify_hmac(self, message: Union[str, bytes], signature: str) -> bool:
         """
         Verify HMAC-SHA256 signature using the derived Khmac key.
         
-        :param message: Message to verify
+        :param message: Message to verify, as text or UTF-8 bytes
         :param signature: Base64 encoded HMAC signature
         :return: True if signature is valid, False otherwise
         :raises ValueError: If keys not derived
@@ -373,10 +447,14 @@ class DiffieHellman(MSLObject):
             raise ValueError("HMAC key not available. Derive keys first.")
         
         try:
-            expected_signature = base64.b64decode(signature)
+            expected_signature = a2b_base64(signature)
         except Exception:
             return False
+
+        # Signature length is not secret, so a malformed signature can be rejected before hashing
+        if len(expected_signature) != self.SIGNATURE_SIZE:
+            return False
         
         # Use compare_digest for constant-time comparison
-        actual_signature = hmac.new(self._khmac, message.encode('utf-8'), hashlib.sha256).digest()
+        actual_signature = self._hmac_digest(message)
         return hmac.compare_digest(actual_signature, expected_signature)
\ No newline at end of file
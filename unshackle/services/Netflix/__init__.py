@@ -2,9 +2,9 @@ import base64
 from datetime import datetime
 import json
 from math import e
-
+import os
 from pathlib import Path
-import random
+import secrets
 import sys
 import time
 import typing
@@ -13,8 +13,9 @@ import click
 import re
 from typing import List, Literal, Optional, Set, Union, Tuple
 from http.cookiejar import CookieJar
+from functools import lru_cache
 from itertools import zip_longest
-from Crypto.Random import get_random_bytes
+from concurrent.futures import ThreadPoolExecutor
 
 import jsonpickle
 from pymp4.parser import Box
@@ -45,6 +46,19 @@ from unshackle.utils.base62 import decode
 from .MSL import MSL, KeyExchangeSchemes
 from .MSL.schemes.UserAuthentication import UserAuthentication
 
+
+@lru_cache(maxsize=512)
+def _lang(code: str) -> Language:
+    """Get a Language by tag, caching the parsed result for language codes repeated across tracks."""
+    return Language.get(code)
+
+
+# Codecs by Netflix content profile, the same few profiles repeat across every stream of a manifest
+_video_codec = lru_cache(maxsize=128)(Video.Codec.from_netflix_profile)
+_audio_codec = lru_cache(maxsize=128)(Audio.Codec.from_netflix_profile)
+_subtitle_codec = lru_cache(maxsize=128)(Subtitle.Codec.from_netflix_profile)
+
+
 class Netflix(Service):
     """
     Service for https://netflix.com
@@ -63,6 +77,14 @@ class Netflix(Service):
         "es": "es-419",
         "pt": "pt-PT",
     }
+    # Maximum concurrent manifest requests per title
+    MANIFEST_WORKERS = 4
+    # Scrubs the " (E3-...)" error code suffix from license error details
+    ERROR_CODE_RE = re.compile(r" \(E3-[^)]+\)")
+    H264_LEVEL_PATTERNS = ("l30", "l31", "l40")
+    H264_LEVEL_RE = re.compile("|".join(H264_LEVEL_PATTERNS))
+    LEVEL_PATTERNS = ("L30", "L31", "L40", "L41", "L50", "L51")
+    LEVEL_RE = re.compile("|".join(LEVEL_PATTERNS))
 
     @staticmethod
     @click.command(name="Netflix", short_help="https://netflix.com")
@@ -91,6 +113,7 @@ class Netflix(Service):
         self.profiles: List[str] = []
         self.requested_profiles: List[str] = []
         self.high_bitrate = high_bitrate
+        self._metadata_cache: dict[tuple[str, Optional[str]], dict] = {}
         
         # MSL
         self.esn = self.cache.get("ESN")
@@ -100,6 +123,11 @@ class Netflix(Service):
         # Download options
         self.range = ctx.parent.params.get("range_") or [Video.Range.SDR]
         self.vcodec = ctx.parent.params.get("vcodec") or Video.Codec.AVC # Defaults to H264
+        self._vcodec_key = self.vcodec.extension.upper()
+        self._vcodec_profiles: dict = {}
+        self._profile_tail: Set[str] = set()
+        self._manifest_params: dict = {}
+        self._profile_ranges: dict[str, Video.Range] = self.build_profile_ranges()
         self.acodec : Audio.Codec = ctx.parent.params.get("acodec") or Audio.Codec.EC3
         self.quality: List[int] = ctx.parent.params.get("quality")
         self.audio_only = ctx.parent.params.get("audio_only")
@@ -138,22 +166,23 @@ class Netflix(Service):
         else:
             # self.log.info(f"Episodes: {jsonpickle.encode(episodes, indent=2)}")
 
-            episode_list: List[Episode] = []
-            for season in metadata["video"]["seasons"]:
-                for episode in season["episodes"]:
-                    episode_list.append(
-                        Episode(
-                            id_=self.title,
-                            title=metadata["video"]["title"],
-                            year=season["year"],
-                            service=self.__class__,
-                            season=season["seq"],
-                            number=episode["seq"],
-                            name=episode["title"],
-                            data=episode,
-                            description=episode["synopsis"],
-                        )
-                    )
+            series_title = metadata["video"]["title"]
+            service = self.__class__
+            episode_list: List[Episode] = [
+                Episode(
+                    id_=self.title,
+                    title=series_title,
+                    year=season["year"],
+                    service=service,
+                    season=season["seq"],
+                    number=episode["seq"],
+                    name=episode["title"],
+                    data=episode,
+                    description=episode["synopsis"],
+                )
+                for season in metadata["video"]["seasons"]
+                for episode in season["episodes"]
+            ]
 
             titles = Series(episode_list)
 
@@ -171,36 +200,47 @@ class Netflix(Service):
         if self.vcodec == Video.Codec.AVC:
             # self.log.info(f"Profile: {self.profile}")
             try:
-                manifest = self.get_manifest(title, self.profiles)
-                movie_track = self.manifest_as_tracks(manifest, title, self.hydrate_track)
-                tracks.add(movie_track)
-
                 if self.profile is not None:
+                    manifest = self.get_manifest(title, self.profiles)
+                    movie_track = self.manifest_as_tracks(manifest, title, self.hydrate_track)
+                    tracks.add(movie_track)
                     self.log.info(f"Requested profiles: {self.profile}")
                 else:
-                    qc_720_profile = [x for x in self.config["profiles"]["video"][self.vcodec.extension.upper()]["QC"] if "l40" not in x and 720 in self.quality]
-                    qc_manifest = self.get_manifest(title, qc_720_profile if 720 in self.quality else self.config["profiles"]["video"][self.vcodec.extension.upper()]["QC"])
-                    qc_tracks = self.manifest_as_tracks(qc_manifest, title, False)
-                    tracks.add(qc_tracks.videos)
-
-                    mpl_manifest = self.get_manifest(title, [x for x in self.config["profiles"]["video"][self.vcodec.extension.upper()]["MPL"] if "l40" not in x])
-                    mpl_tracks = self.manifest_as_tracks(mpl_manifest, title, False)
-                    tracks.add(mpl_tracks.videos)
+                    qc_profiles = self._vcodec_profiles["QC"]
+                    if 720 in self.quality:
+                        qc_profiles = [x for x in qc_profiles if "l40" not in x]
+                    mpl_profiles = [x for x in self._vcodec_profiles["MPL"] if "l40" not in x]
+                    # `self.profiles` already holds every H.264 profile, so one manifest usually covers
+                    # QC and MPL too. Only request the groups it is missing any profile of
+                    manifest = self.get_manifest(title, self.profiles)
+                    returned_profiles = {stream["content_profile"] for stream in manifest["video_tracks"][0]["streams"]}
+                    missing_profiles = [x for x in (qc_profiles, mpl_profiles) if x and not returned_profiles.issuperset(x)]
+                    with ThreadPoolExecutor(max_workers=max(1, len(missing_profiles))) as pool:
+                        extra_manifests = [pool.submit(self.get_manifest, title, x) for x in missing_profiles]
+
+                        movie_track = self.manifest_as_tracks(manifest, title, self.hydrate_track)
+                        tracks.add(movie_track)
+
+                        for extra_manifest in extra_manifests:
+                            extra_tracks = self.manifest_as_tracks(extra_manifest.result(), title, False)
+                            tracks.add(extra_tracks.videos)
             except Exception as e:
                 self.log.error(e)
         else:
             if self.high_bitrate:
                 splitted_profiles = self.split_profiles(self.profiles)
                 self.log.info(splitted_profiles)
-                for index, profile_list in enumerate(splitted_profiles):
-                    try:
-                        self.log.debug(f"Index: {index}. Getting profiles: {profile_list}")
-                        manifest = self.get_manifest(title, profile_list)
-                        manifest_tracks = self.manifest_as_tracks(manifest, title, self.hydrate_track if index == 0 else False)
-                        tracks.add(manifest_tracks if index == 0 else manifest_tracks.videos)
-                    except Exception:
-                        self.log.error(f"Error getting profile: {profile_list}. Skipping")
-                        continue
+                # Request every profile group's manifest concurrently, then build tracks in order
+                with ThreadPoolExecutor(max_workers=max(1, min(self.MANIFEST_WORKERS, len(splitted_profiles)))) as pool:
+                    manifests = [pool.submit(self.get_manifest, title, profile_list) for profile_list in splitted_profiles]
+                    for index, (profile_list, manifest) in enumerate(zip(splitted_profiles, manifests)):
+                        try:
+                            self.log.debug(f"Index: {index}. Getting profiles: {profile_list}")
+                            manifest_tracks = self.manifest_as_tracks(manifest.result(), title, self.hydrate_track if index == 0 else False)
+                            tracks.add(manifest_tracks if index == 0 else manifest_tracks.videos)
+                        except Exception:
+                            self.log.error(f"Error getting profile: {profile_list}. Skipping")
+                            continue
             else:
                 try:
                     manifest = self.get_manifest(title, self.profiles)
@@ -234,41 +274,41 @@ class Netflix(Service):
         """
         # Define the profile patterns to match based on video codec
         if self.vcodec == Video.Codec.AVC:  # H264
-            patterns = ["l30", "l31", "l40"]
+            patterns, pattern_re = self.H264_LEVEL_PATTERNS, self.H264_LEVEL_RE
         else:
-            patterns = ["L30", "L31", "L40", "L41", "L50", "L51"]
-        
-        # Group profiles by pattern
-        result: List[List[str]] = []
-        for pattern in patterns:
-            pattern_group = []
-            for profile in profiles:
-                if pattern in profile:
-                    pattern_group.append(profile)
-            if pattern_group:  # Only add non-empty groups
-                result.append(pattern_group)
-        
-        return result
+            patterns, pattern_re = self.LEVEL_PATTERNS, self.LEVEL_RE
+
+        # Group profiles by pattern in a single pass
+        buckets: dict[str, List[str]] = {pattern: [] for pattern in patterns}
+        for profile in profiles:
+            match = pattern_re.search(profile)
+            if match:
+                buckets[match.group(0)].append(profile)
+
+        # Only return non-empty groups, in pattern order
+        return [buckets[pattern] for pattern in patterns if buckets[pattern]]
         
         
     def get_chapters(self, title: Title_T) -> Chapters:
         chapters: Chapters = Chapters()
         # self.log.info(f"Title data: {title.data}")
-        credits = title.data["skipMarkers"]["credit"]
-        if credits["start"] > 0 and credits["end"] > 0:
+        data = title.data
+        credits = data["skipMarkers"]["credit"]
+        start, end = credits["start"], credits["end"]
+        if start > 0 and end > 0:
             chapters.add(Chapter(
-                timestamp=credits["start"], # Milliseconds
+                timestamp=start, # Milliseconds
                 name="Intro"
             ))
             chapters.add(
                 Chapter(
-                    timestamp=credits["end"], # Milliseconds
+                    timestamp=end, # Milliseconds
                     name="Part 01"
                 )
             )
 
         chapters.add(Chapter(
-            timestamp=float(title.data["creditsOffset"]), # this is seconds, needed to assign to float
+            timestamp=float(data["creditsOffset"]), # this is seconds, needed to assign to float
             name="Outro"
         ))
 
@@ -278,19 +318,21 @@ class Netflix(Service):
         if not self.msl:
             self.log.error(f"MSL Client is not intialized!")
             sys.exit(1)
+        now = time.time()
+        now_int = int(now)
         application_data = {
                 "version": 2,
                 "url": track.data["license_url"],
-                "id": int(time.time() * 10000),
+                "id": int(now * 10000),
                 "esn": self.esn.data,
                 "languages": ["en-US"],
                 # "uiVersion": "shakti-v9dddfde5",
                 "clientVersion": "6.0026.291.011",
                 "params": [{
-                    "sessionId": base64.b64encode(get_random_bytes(16)).decode("utf-8"),
-                    "clientTime": int(time.time()),
-                    "challengeBase64": base64.b64encode(challenge).decode("utf-8"),
-                    "xid": str(int((int(time.time()) + 0.1612) * 1000)),
+                    "sessionId": base64.b64encode(os.urandom(16)).decode("ascii"),
+                    "clientTime": now_int,
+                    "challengeBase64": base64.b64encode(challenge).decode("ascii"),
+                    "xid": str(int((now_int + 0.1612) * 1000)),
                 }],
                 "echo": "sessionId"
             }
@@ -309,7 +351,7 @@ class Netflix(Service):
         if "error" in payload_data[0]:
             error = payload_data[0]["error"]
             error_display = error.get("display")
-            error_detail = re.sub(r" \(E3-[^)]+\)", "", error.get("detail", ""))
+            error_detail = self.ERROR_CODE_RE.sub("", error.get("detail", ""))
 
             if error_display:
                 self.log.critical(f" - {error_display}")
@@ -328,10 +370,15 @@ class Netflix(Service):
 
     def configure(self):
         # self.log.info(ctx)
+        # Make sure video codec is supported by Netflix
+        if self._vcodec_key not in self.config["profiles"]["video"]:
+            raise ValueError(f"Video Codec {self.vcodec} is not supported by Netflix")
+        self._vcodec_profiles = self.config["profiles"]["video"][self._vcodec_key]
+
         # if profile is none from argument let's use them all profile in video codec scope
         # self.log.info(f"Requested profiles: {self.profile}")
         if self.profile is None:
-            self.profiles = self.config["profiles"]["video"][self.vcodec.extension.upper()]
+            self.profiles = self._vcodec_profiles
 
 
         if self.profile is not None:
@@ -339,12 +386,9 @@ class Netflix(Service):
             self.log.info(f"Requested profile: {self.requested_profiles}")
         else:
             # self.log.info(f"Video Range: {self.range}")
-            self.requested_profiles = self.config["profiles"]["video"][self.vcodec.extension.upper()]
-        # Make sure video codec is supported by Netflix
-        if self.vcodec.extension.upper() not in self.config["profiles"]["video"]:
-            raise ValueError(f"Video Codec {self.vcodec} is not supported by Netflix")
+            self.requested_profiles = self._vcodec_profiles
 
-        if self.range[0].name not in list(self.config["profiles"]["video"][self.vcodec.extension.upper()].keys()) and self.vcodec != Video.Codec.AVC and self.vcodec != Video.Codec.VP9:
+        if self.range[0].name not in self._vcodec_profiles and self.vcodec != Video.Codec.AVC and self.vcodec != Video.Codec.VP9:
             self.log.error(f"Video range {self.range[0].name} is not supported by Video Codec: {self.vcodec}")
             sys.exit(1)
 
@@ -357,6 +401,61 @@ class Netflix(Service):
             sys.exit(1)
 
         self.profiles = self.get_profiles()
+        # Audio, subtitle and (for H.264) baseline profiles are requested with every manifest
+        self._profile_tail = set(flatten(as_list(
+            self.config["profiles"]["audio"].values(),
+            self.config["profiles"]["video"]["H264"]["BPL"] if self.vcodec == Video.Codec.AVC else [],
+            self.config["profiles"]["subtitles"],
+        )))
+        # Manifest request parameters that do not change between titles, see get_manifest
+        challenge = self.config["payload_challenge_pr"] if self.drm_system == 'playready' else self.config["payload_challenge"]
+        self._manifest_params = {
+            "clientVersion": "6.0051.090.911",
+            "challenge": challenge,
+            "challanges": {
+                "default": challenge
+            },
+            "contentPlaygraph": ["v2"],
+            "deviceSecurityLevel": "3000",
+            "drmVersion": 25,
+            "desiredVmaf": "plus_lts",
+            "desiredSegmentVmaf": "plus_lts",
+            "flavor": "STANDARD",  # ? PRE_FETCH, SUPPLEMENTAL
+            "drmType": self.drm_system,
+            "imageSubtitleHeight": 1080,
+            "isBranching": False,
+            "isNonMember": False,
+            "isUIAutoPlay": False,
+            "licenseType": "standard",
+            "liveAdsCapability": "replace",
+            "liveMetadataFormat": "INDEXED_SEGMENT_TEMPLATE",
+            "manifestVersion": "v2",
+            "osName": "windows",
+            "osVersion": "10.0",
+            "platform": "138.0.0.0",
+            "preferAssistiveAudio": False,
+            "requestSegmentVmaf": False,
+            "supportsAdBreakHydration": False,
+            "supportsNetflixMediaEvents": True,
+            "supportsPartialHydration": True, # This is important if you want get available all tracks. but you must fetch each missing url tracks with "requiredAudioTracksId" or "requiredTextTrackId"
+            "supportsPreReleasePin": True,
+            "supportsUnequalizedDownloadables": True,
+            "supportsWatermark": True,
+            "type": "standard",  # ? PREPARE
+            "uiPlatform": "SHAKTI",
+            "uiVersion": "shakti-v49577320",
+            "useBetterTextUrls": True,
+            "useHttpsStreams": True,
+            "usePsshBox": True,
+            "videoOutputInfo": [{
+                # todo ; make this return valid, but "secure" values, maybe it helps
+                "type": "DigitalVideoOutputDescriptor",
+                "outputType": "unknown",
+                "supportedHdcpVersions": self.config["configuration"]["supported_hdcp_versions"],
+                "isHdcpEngaged": self.config["configuration"]["is_hdcp_engaged"]
+            }],
+            "showAllSubDubTracks": True,
+        }
         self.log.info("Intializing a MSL client")
         self.get_esn()
         scheme = KeyExchangeSchemes.AsymmetricWrapped
@@ -385,35 +484,33 @@ class Netflix(Service):
         if self.vcodec == Video.Codec.AVC:
             if self.requested_profiles is not None:
                 for requested_profiles in self.requested_profiles:
-                    result_profiles.extend(flatten(list(self.config["profiles"]["video"][self.vcodec.extension.upper()][requested_profiles])))
+                    result_profiles.extend(flatten(list(self._vcodec_profiles[requested_profiles])))
                 return result_profiles
                 
-            result_profiles.extend(flatten(list(self.config["profiles"]["video"][self.vcodec.extension.upper()].values())))
+            result_profiles.extend(flatten(list(self._vcodec_profiles.values())))
             return result_profiles
 
         # Handle case for codec VP9
         if self.vcodec == Video.Codec.VP9 and self.range[0] != Video.Range.HDR10:
-            result_profiles.extend(self.config["profiles"]["video"][self.vcodec.extension.upper()].values())
+            result_profiles.extend(self._vcodec_profiles.values())
             return result_profiles
-        for profiles in self.config["profiles"]["video"][self.vcodec.extension.upper()]:
+        for profiles in self._vcodec_profiles:
             for range in self.range:
                 if range in profiles:
-                    result_profiles.extend(self.config["profiles"]["video"][self.vcodec.extension.upper()][range.name])
+                    result_profiles.extend(self._vcodec_profiles[range.name])
                     # sys.exit(1)
         self.log.debug(f"Result_profiles: {result_profiles}")
         return result_profiles
         
     def get_esn(self):
-        ESN_GEN = "".join(random.choice("0123456789ABCDEF") for _ in range(30))
-        esn_value = f"NFCDIE-03-{ESN_GEN}"
         path = Path(".esn")
         if path.exists():
-            esn = open(path).read()
-            self.esn.set(esn)
+            self.esn.set(path.read_text())
             return
         # Check if ESN is expired or doesn't exist
         if self.esn.data is None or self.esn.data == {} or (hasattr(self.esn, 'expired') and self.esn.expired):
             # Set new ESN with 6-hour expiration
+            esn_value = f"NFCDIE-03-{secrets.token_hex(15).upper()}"
             self.esn.set(esn_value, 1 * 60 * 60)  # 1 hours in seconds
             self.log.info(f"Generated new ESN with 1-hour expiration")
         else:
@@ -424,9 +521,19 @@ class Netflix(Service):
     def get_metadata(self, title_id: str):
         """
         Obtain Metadata information about a title by it's ID.
+        Metadata is cached per title ID and metadata language, in memory and on disk for an hour.
         :param title_id: Title's ID.
         :returns: Title Metadata.
         """
+        cache_key = (title_id, self.meta_lang)
+        if cache_key in self._metadata_cache:
+            return self._metadata_cache[cache_key]
+
+        cache = self.cache.get(f"metadata_{title_id}_{self.meta_lang or 'default'}")
+        if cache and not cache.expired:
+            self.log.debug(f"Using cached metadata for {title_id}")
+            self._metadata_cache[cache_key] = cache.data
+            return cache.data
 
         try:
             metadata = self.session.get(
@@ -440,7 +547,7 @@ class Netflix(Service):
                 }
             )
             self.log.info(f"Getting {int(title_id)}")
-            metadata=metadata.json()
+            metadata = json.loads(metadata.content)
         except requests.HTTPError as e:
             if e.response.status_code == 500:
                 self.log.warning(
@@ -462,16 +569,13 @@ class Netflix(Service):
                     f" - Failed to get metadata, cookies might be expired. ({metadata['message']})"
                 )
                 sys.exit(1)
+            if "video" in metadata:
+                cache.set(metadata, expiration=60 * 60)
+                self._metadata_cache[cache_key] = metadata
             return metadata
 
     def get_manifest(self, title: Title_T, video_profiles: List[str], required_text_track_id: Optional[str] = None, required_audio_track_id: Optional[str] = None):
-        audio_profiles = self.config["profiles"]["audio"].values()
-        video_profiles = sorted(set(flatten(as_list(
-                video_profiles,
-                audio_profiles,
-                self.config["profiles"]["video"]["H264"]["BPL"] if self.vcodec == Video.Codec.AVC else [],
-                self.config["profiles"]["subtitles"],
-        ))))
+        video_profiles = sorted(self._profile_tail.union(flatten(video_profiles)))
         
 
             
@@ -485,74 +589,32 @@ class Netflix(Service):
             "reqPriority": 10,
             "reqName": "manifest",
         }
+        viewable_id = title.data.get("episodeId", title.data["id"])
+        now_int = int(time.time())
         _, payload_chunks = self.msl.send_message(
             endpoint=self.config["endpoints"]["manifest"],
             params=params,
             application_data={
                 "version": 2,
                 "url": "manifest",
-                "id": int(time.time()),
+                "id": now_int,
                 "esn": self.esn.data,
                 "languages": ["en-US"],
                 "clientVersion": "6.0026.291.011",
                 "params": {
-                    "clientVersion": "6.0051.090.911",
-                    "challenge": self.config["payload_challenge_pr"] if self.drm_system == 'playready' else self.config["payload_challenge"],
-                    "challanges": {
-                        "default": self.config["payload_challenge_pr"] if self.drm_system == 'playready' else self.config["payload_challenge"]
-                    },
-                    "contentPlaygraph": ["v2"],
-                    "deviceSecurityLevel": "3000",
-                    "drmVersion": 25,
-                    "desiredVmaf": "plus_lts",
-                    "desiredSegmentVmaf": "plus_lts",
-                    "flavor": "STANDARD",  # ? PRE_FETCH, SUPPLEMENTAL
-                    "drmType": self.drm_system,
-                    "imageSubtitleHeight": 1080,
-                    "isBranching": False,
-                    "isNonMember": False,
-                    "isUIAutoPlay": False,
-                    "licenseType": "standard",
-                    "liveAdsCapability": "replace",
-                    "liveMetadataFormat": "INDEXED_SEGMENT_TEMPLATE",
-                    "manifestVersion": "v2",
-                    "osName": "windows",
-                    "osVersion": "10.0",
-                    "platform": "138.0.0.0",
+                    **self._manifest_params,
                     "profilesGroups": [{
                         "name": "default",
                         "profiles": video_profiles
                     }],
                     "profiles": video_profiles,
-                    "preferAssistiveAudio": False,
-                    "requestSegmentVmaf": False,
                     "requiredAudioTrackId": required_audio_track_id, # This is for getting missing audio tracks (value get from `new_track_id``)
                     "requiredTextTrackId": required_text_track_id, # This is for getting missing subtitle. (value get from `new_track_id``)
-                    "supportsAdBreakHydration": False,
-                    "supportsNetflixMediaEvents": True,
-                    "supportsPartialHydration": True, # This is important if you want get available all tracks. but you must fetch each missing url tracks with "requiredAudioTracksId" or "requiredTextTrackId"
-                    "supportsPreReleasePin": True,
-                    "supportsUnequalizedDownloadables": True,
-                    "supportsWatermark": True,
                     "titleSpecificData": {
-                        title.data.get("episodeId", title.data["id"]): {"unletterboxed": False}
+                        viewable_id: {"unletterboxed": False}
                     },
-                    "type": "standard",  # ? PREPARE
-                    "uiPlatform": "SHAKTI",
-                    "uiVersion": "shakti-v49577320",
-                    "useBetterTextUrls": True,
-                    "useHttpsStreams": True,
-                    "usePsshBox": True,
-                    "videoOutputInfo": [{
-                        # todo ; make this return valid, but "secure" values, maybe it helps
-                        "type": "DigitalVideoOutputDescriptor",
-                        "outputType": "unknown",
-                        "supportedHdcpVersions": self.config["configuration"]["supported_hdcp_versions"],
-                        "isHdcpEngaged": self.config["configuration"]["is_hdcp_engaged"]
-                    }],
-                    "viewableId": title.data.get("episodeId", title.data["id"]),
-                    "xid": str(int((int(time.time()) + 0.1612) * 1000)),
-                    "showAllSubDubTracks": True,
+                    "viewableId": viewable_id,
+                    "xid": str(int((now_int + 0.1612) * 1000)),
                 }
             },
             userauthdata=self.userauthdata
@@ -563,14 +625,12 @@ class Netflix(Service):
         #     r.write(jsonpickle.encode(payload_chunks, indent=4))
         return payload_chunks
         
-    @staticmethod
-    def get_original_language(manifest) -> Language:
+    def get_original_language(self, manifest) -> Language:
         for language in manifest["audio_tracks"]:
-            self.log.info(language["languageDescription"]
             if language["languageDescription"].endswith(" [Original]"):
-                return Language.get(language["language"])
+                return _lang(language["language"])
         # e.g. get `en` from "A:1:1;2;en;0;|V:2:1;[...]"
-        l = Language.get(manifest["defaultTrackOrderList"][0]["mediaId"].split(";")[2])
+        l = _lang(manifest["defaultTrackOrderList"][0]["mediaId"].split(";")[2])
         self.log.info(l)
         return l
 
@@ -581,26 +641,36 @@ class Netflix(Service):
         
         tracks = Tracks()
         original_language = self.get_original_language(manifest)
+        # Tracks are matched against the original language by plain language code
+        orig_lang_code = original_language.language
         self.log.debug(f"Original language: {original_language}")
         license_url = manifest["links"]["license"]["href"]
         # self.log.info(f"Video: {jsonpickle.encode(manifest["video_tracks"], indent=2)}")
         # self.log.info()
-        for video in reversed(manifest["video_tracks"][0]["streams"]):
+        video_track = manifest["video_tracks"][0]
+        pssh_data = video_track["drmHeader"]["bytes"]
+        video_language = original_language
+        # Collect the tracks and add them to `tracks` in bulk
+        new_tracks: List[AnyTrack] = []
+        append = new_tracks.append
+        # Stream order does not matter, video tracks are sorted by bitrate before selection
+        for video in video_track["streams"]:
             # self.log.info(video)
             id = video["downloadable_id"]
+            content_profile = video["content_profile"]
             # self.log.info(f"Adding video {video["res_w"]}x{video["res_h"]}, bitrate: {(float(video["framerate_value"]) / video["framerate_scale"]) if "framerate_value" in video else None} with profile {video["content_profile"]}. kid: {video["drmHeaderId"]}")
-            tracks.add(
+            append(
                 Video(
                     id_=video["downloadable_id"],
                     url=video["urls"][0]["url"],
-                    codec=Video.Codec.from_netflix_profile(video["content_profile"]),
+                    codec=_video_codec(content_profile),
                     bitrate=video["bitrate"] * 1000,
                     width=video["res_w"],
                     height=video["res_h"],
                     fps=(float(video["framerate_value"]) / video["framerate_scale"]) if "framerate_value" in video else None,
-                    language=Language.get(original_language),
-                    edition=video["content_profile"],
-                    range_=self.parse_video_range_from_profile(video["content_profile"]),
+                    language=video_language,
+                    edition=content_profile,
+                    range_=self.parse_video_range_from_profile(content_profile),
                     drm=[Widevine(
                         pssh=PSSH(
                             # Box.parse(
@@ -614,7 +684,7 @@ class Netflix(Service):
                             #         )
                             #     )
                             # )
-                            manifest["video_tracks"][0]["drmHeader"]["bytes"]
+                            pssh_data
                         ),
                         kid=video["drmHeaderId"]
                     )],
@@ -634,21 +704,26 @@ class Netflix(Service):
                 unavailable_audio_tracks.append((audio["new_track_id"], audio["id"])) # Assign to `unavailable_subtitle` for request missing audio tracks later
                 continue
             # self.log.debug(f"Adding audio lang: {audio["language"]} with profile: {audio["content_profile"]}")
-            is_original_lang = audio["language"] == original_language.language
+            audio_lang = audio["language"]
+            is_original_lang = audio_lang == orig_lang_code
             # self.log.info(f"is audio {audio["languageDescription"]} original language: {is_original_lang}")
+            audio_language = _lang(self.NF_LANG_MAP.get(audio_lang) or audio_lang)
+            audio_name = "[Original]" if _lang(audio_lang).language == orig_lang_code else None
+            descriptive = audio.get("rawTrackType", "").lower() == "assistive"
             for stream in audio["streams"]:
-                tracks.add(
+                content_profile = stream["content_profile"]
+                append(
                     Audio(
                         id_=stream["downloadable_id"],
                         url=stream["urls"][0]["url"],
-                        codec=Audio.Codec.from_netflix_profile(stream["content_profile"]),
-                        language=Language.get(self.NF_LANG_MAP.get(audio["language"]) or audio["language"]),
+                        codec=_audio_codec(content_profile),
+                        language=audio_language,
                         is_original_lang=is_original_lang,
                         bitrate=stream["bitrate"] * 1000,
                         channels=stream["channels"],
-                        descriptive=audio.get("rawTrackType", "").lower() == "assistive",
-                        name="[Original]" if Language.get(audio["language"]).language == original_language.language else None,
-                        joc=6 if "atmos" in stream["content_profile"] else None
+                        descriptive=descriptive,
+                        name=audio_name,
+                        joc=6 if "atmos" in content_profile else None
                     )
                 )
 
@@ -672,81 +747,81 @@ class Netflix(Service):
                 continue
                 # pass
 
-            id = list(subtitle["downloadableIds"].values())
-            language = Language.get(subtitle["language"])
-            profile = next(iter(subtitle["ttDownloadables"].keys()))
-            tt_downloadables = next(iter(subtitle["ttDownloadables"].values()))
-            is_original_lang = subtitle["language"] == original_language.language
-            # self.log.info(f"is subtitle {subtitle["languageDescription"]} original language {is_original_lang}")   
-            # self.log.info(f"ddd")
-            tracks.add(
-                Subtitle(
-                    id_=id[0],
-                    url=tt_downloadables["urls"][0]["url"],
-                    codec=Subtitle.Codec.from_netflix_profile(profile),
-                    language=language,
-                    forced=subtitle["isForcedNarrative"],
-                    cc=subtitle["rawTrackType"] == "closedcaptions",
-                    sdh=subtitle["trackVariant"] == 'STRIPPED_SDH' if "trackVariant" in subtitle else False,
-                    is_original_lang=is_original_lang,
-                    name=("[Original]" if language.language == original_language.language else None or "[Dubbing]" if "trackVariant" in subtitle and subtitle["trackVariant"] == "DUBTITLE" else None),
-                )
-            )
+            append(self.subtitle_as_track(subtitle, orig_lang_code))
+        tracks.add(new_tracks)
         if hydrate_tracks == False:
             return tracks
         # Hydrate missing tracks
         self.log.info(f"Getting all missing audio and subtitle tracks")
-        for audio_hydration, subtitle_hydration in zip_longest(unavailable_audio_tracks, unavailable_subtitle, fillvalue=("N/A", "N/A")):
-            # self.log.info(f"Audio hydration: {audio_hydration}")
-            manifest = self.get_manifest(title, self.profiles, subtitle_hydration[0], audio_hydration[0])
+        hydrations = list(zip_longest(unavailable_audio_tracks, unavailable_subtitle, fillvalue=("N/A", "N/A")))
+        if not hydrations:
+            return tracks
+        new_tracks = []
+        append = new_tracks.append
+        # Every hydration is a separate manifest request, fetch them concurrently and add the tracks in order
+        with ThreadPoolExecutor(max_workers=min(self.MANIFEST_WORKERS, len(hydrations))) as pool:
+            manifests = [
+                pool.submit(self.get_manifest, title, self.profiles, subtitle_hydration[0], audio_hydration[0])
+                for audio_hydration, subtitle_hydration in hydrations
+            ]
+            for (audio_hydration, subtitle_hydration), manifest in zip(hydrations, manifests):
+                # self.log.info(f"Audio hydration: {audio_hydration}")
+                manifest = manifest.result()
             
-            audios = next(item for item in manifest["audio_tracks"] if 'id' in item and item["id"] == audio_hydration[1])
-            subtitles = next(item for item in manifest["timedtexttracks"] if 'id' in item and item["id"] == subtitle_hydration[1])
-            for stream in audios["streams"]:
-                if audio_hydration[0] == 'N/A' and audio_hydration[1] == 'N/A':
-                    # self.log.info(f"Skipping not available hydrated audio tracks")
-                    continue
-                tracks.add(
-                    Audio(
-                        id_=stream["downloadable_id"],
-                        url=stream["urls"][0]["url"],
-                        codec=Audio.Codec.from_netflix_profile(stream["content_profile"]),
-                        language=Language.get(self.NF_LANG_MAP.get(audios["language"]) or audios["language"]),
-                        is_original_lang=stream["language"] == original_language.language,
-                        bitrate=stream["bitrate"] * 1000,
-                        channels=stream["channels"],
-                        descriptive=audios.get("rawTrackType", "").lower() == "assistive",
-                        name="[Original]" if Language.get(audios["language"]).language == original_language.language else None,
-                        joc=6 if "atmos" in stream["content_profile"] else None
-                    )
-                )
+                # Index the hydrated manifest's tracks once; ids of "N/A" padding never match
+                audios = {item["id"]: item for item in manifest["audio_tracks"] if "id" in item}.get(audio_hydration[1])
+                subtitles = {item["id"]: item for item in manifest["timedtexttracks"] if "id" in item}.get(subtitle_hydration[1])
+                if audios is not None:
+                    audio_lang = audios["language"]
+                    audio_language = _lang(self.NF_LANG_MAP.get(audio_lang) or audio_lang)
+                    audio_name = "[Original]" if _lang(audio_lang).language == orig_lang_code else None
+                    descriptive = audios.get("rawTrackType", "").lower() == "assistive"
+                    for stream in audios["streams"]:
+                        content_profile = stream["content_profile"]
+                        append(
+                            Audio(
+                                id_=stream["downloadable_id"],
+                                url=stream["urls"][0]["url"],
+                                codec=_audio_codec(content_profile),
+                                language=audio_language,
+                                is_original_lang=stream["language"] == orig_lang_code,
+                                bitrate=stream["bitrate"] * 1000,
+                                channels=stream["channels"],
+                                descriptive=descriptive,
+                                name=audio_name,
+                                joc=6 if "atmos" in content_profile else None
+                            )
+                        )
             
-            # self.log.info(jsonpickle.encode(subtitles, indent=2))
-            # sel
+                # self.log.info(jsonpickle.encode(subtitles, indent=2))
+                # sel
             
-            if subtitle_hydration[0] == 'N/A':
-                # self.log.info(f"Skipping not available hydrated subtitle tracks")
-                continue
-            id = list(subtitles["downloadableIds"].values())
-            language = Language.get(subtitles["language"])
-            profile = next(iter(subtitles["ttDownloadables"].keys()))
-            tt_downloadables = next(iter(subtitles["ttDownloadables"].values()))
-            tracks.add(
-                Subtitle(
-                    id_=id[0],
-                    url=tt_downloadables["urls"][0]["url"],
-                    codec=Subtitle.Codec.from_netflix_profile(profile),
-                    language=language,
-                    forced=subtitles["isForcedNarrative"],
-                    cc=subtitles["rawTrackType"] == "closedcaptions",
-                    sdh=subtitles["trackVariant"] == 'STRIPPED_SDH' if "trackVariant" in subtitles else False,
-                    is_original_lang=subtitles["language"] == original_language.language,
-                    name=("[Original]" if language.language == original_language.language else None or "[Dubbing]" if "trackVariant" in subtitle and subtitle["trackVariant"] == "DUBTITLE" else None),
-                )
-            )
-                
+                if subtitles is None:
+                    # self.log.info(f"Skipping not available hydrated subtitle tracks")
+                    continue
+                append(self.subtitle_as_track(subtitles, orig_lang_code))
+
+        tracks.add(new_tracks)
         return tracks
 
+    def subtitle_as_track(self, subtitle: dict, orig_lang_code: str) -> Subtitle:
+        """Build a Subtitle track from a Netflix manifest timedtext track entry."""
+        subtitle_lang = subtitle["language"]
+        language = _lang(subtitle_lang)
+        profile, tt_downloadables = next(iter(subtitle["ttDownloadables"].items()))
+        track_variant = subtitle.get("trackVariant")
+        return Subtitle(
+            id_=next(iter(subtitle["downloadableIds"].values())),
+            url=tt_downloadables["urls"][0]["url"],
+            codec=_subtitle_codec(profile),
+            language=language,
+            forced=subtitle["isForcedNarrative"],
+            cc=subtitle["rawTrackType"] == "closedcaptions",
+            sdh=track_variant == 'STRIPPED_SDH',
+            is_original_lang=subtitle_lang == orig_lang_code,
+            name=("[Original]" if language.language == orig_lang_code else "[Dubbing]" if track_variant == "DUBTITLE" else None),
+        )
+
     
     def parse_video_range_from_profile(self, profile: str) -> Video.Range:
         """
@@ -764,25 +839,25 @@ class Netflix(Service):
             >>> parse_video_range_from_profile("hevc-dv5-main10-L30-dash-cenc")
             <Video.Range.DV: 'DV'>
         """
-        
-        # Get video profiles from config
-        video_profiles = self.config.get("profiles", {}).get("video", {})
-        
-        # Search through all codecs and ranges to find the profile
-        for codec, ranges in video_profiles.items():
-            # if codec == 'H264':
-            #     return Video.Range.SDR # for H264 video always return SDR
+        # Profiles missing from the config default to SDR
+        return self._profile_ranges.get(profile, Video.Range.SDR)
+
+    def build_profile_ranges(self) -> dict[str, Video.Range]:
+        """
+        Map every configured Netflix video profile to its Video.Range.
+
+        Profiles listed under a name that is not a valid Video.Range (e.g. H.264's "BPL") map to SDR.
+        If a profile is listed more than once, its first range wins.
+        """
+        profile_ranges: dict[str, Video.Range] = {}
+        for ranges in self.config.get("profiles", {}).get("video", {}).values():
             for range_name, profiles in ranges.items():
-                # self.log.info(f"Checking range {range_name}")
-                if profile in profiles:
-                    # Return the corresponding Video.Range enum value
-                    try:
-                        # self.log.info(f"Found {range_name}")
-                        return Video.Range(range_name)
-                    except ValueError:
-                        # If range_name is not a valid Video.Range, return SDR as default
-                        self.log.debug(f"Video range is not valid {range_name}")
-                        return Video.Range.SDR
-        
-        # If profile not found, return SDR as default
-        return Video.Range.SDR
+                try:
+                    range_ = Video.Range(range_name)
+                except ValueError:
+                    self.log.debug(f"Video range is not valid {range_name}")
+                    range_ = Video.Range.SDR
+                for profile in profiles:
+                    if isinstance(profile, str):
+                        profile_ranges.setdefault(profile, range_)
+        return profile_ranges
@@ -1,24 +1,17 @@
 import platform
 
+# Map platform.system() output to desired OS name, anything else is treated as linux
+OS_NAMES = {"windows": "win", "darwin": "osx"}
+# Map platform.machine() output to desired architecture, anything else is kept as-is
+OS_ARCHS = {"x86_64": "x64", "amd64": "x64", "arm64": "arm64"}
 
-def get_os_arch(name: str) -> str:
-    """Builds a name-os-arch based on the input name, system, architecture."""
-    os_name = platform.system().lower()
-    os_arch = platform.machine().lower()
-
-    # Map platform.system() output to desired OS name
-    if os_name == "windows":
-        os_name = "win"
-    elif os_name == "darwin":
-        os_name = "osx"
-    else:
-        os_name = "linux"
+# The host never changes while running, so resolve it once
+_os_name = OS_NAMES.get(platform.system().lower(), "linux")
+_os_arch = platform.machine().lower()
+_os_arch = OS_ARCHS.get(_os_arch, _os_arch)
 
-    # Map platform.machine() output to desired architecture
-    if os_arch in ["x86_64", "amd64"]:
-        os_arch = "x64"
-    elif os_arch == "arm64":
-        os_arch = "arm64"
 
+def get_os_arch(name: str) -> str:
+    """Builds a name-os-arch based on the input name, system, architecture."""
     # Construct the dependency name in the desired format using the input name
-    return f"{name}-{os_name}-{os_arch}"
+    return f"{name}-{_os_name}-{_os_arch}"
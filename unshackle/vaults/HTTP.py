@@ -1,12 +1,50 @@
 import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from typing import Iterator, Optional, Union
+from urllib.parse import urlparse
 from uuid import UUID
 
-from requests import Session
+from requests import RequestException, Session
+from requests.adapters import HTTPAdapter, Retry
 
 from unshackle.core import __version__
-from unshackle.core.vault import Vault
+from unshackle.core.vault import Vault, is_null_key
+
+
+# Connection pools shared by every vault on the same (scheme, host, port), so their connections are reused.
+# Only the adapter is shared, each vault keeps its own Session and with it its own cookies and headers
+_ADAPTERS: dict[tuple[str, str, Optional[int]], HTTPAdapter] = {}
+_ADAPTERS_LOCK = threading.Lock()
+
+
+def _get_adapter(url: str) -> HTTPAdapter:
+    """Get the shared HTTPAdapter for the vault host of a URL, creating it on first use."""
+    parsed = urlparse(url)
+    origin = (parsed.scheme.lower(), (parsed.hostname or "").lower(), parsed.port)
+    with _ADAPTERS_LOCK:
+        adapter = _ADAPTERS.get(origin)
+        if adapter is None:
+            adapter = _ADAPTERS[origin] = HTTPAdapter(
+                # Key lookups and inserts are safe to repeat, so POSTs are retried too
+                max_retries=Retry(
+                    total=3,
+                    # a vault that stalled once is not waited on again, so one lookup can't block for minutes
+                    read=0,
+                    backoff_factor=0.2,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                    allowed_methods=frozenset(["GET", "POST"]),
+                    # hand back the last error response so its status/body is handled like before
+                    raise_on_status=False,
+                ),
+                pool_connections=1,
+                pool_maxsize=HTTP.POOL_SIZE,
+            )
+        return adapter
 
 
 class InsertResult(Enum):
@@ -18,7 +56,28 @@ class InsertResult(Enum):
 class HTTP(Vault):
     """Key Vault using HTTP API with support for both query parameters and JSON payloads."""
 
-    def __init__(self, name: str, host: str, password: str, username: Optional[str] = None, api_mode: str = "query"):
+    # Keep-alive connections held open to the vault host, enough for concurrent key requests
+    POOL_SIZE = 16
+    # Concurrent per-KID requests when keys cannot be inserted in one batch
+    MAX_WORKERS = 8
+    # (connect, read) timeout for every vault request, in seconds
+    TIMEOUT = (3.05, 30)
+    # (connect, read) timeout for single key lookups, which run inline with downloads and should fail fast
+    LOOKUP_TIMEOUT = (3.05, 5)
+    # Most recently looked up (service, KID) -> Content Key pairs kept in memory
+    KEY_CACHE_SIZE = 4096
+    # Seconds a fetched list of services is reused for
+    SERVICES_TTL = 60
+
+    def __init__(
+        self,
+        name: str,
+        host: str,
+        password: str,
+        username: Optional[str] = None,
+        api_mode: str = "query",
+        no_push: bool = False,
+    ):
         """
         Initialize HTTP Vault.
 
@@ -28,8 +87,10 @@ class HTTP(Vault):
             password: Password for query mode or API token for json mode
             username: Username (required for query mode, ignored for json mode)
             api_mode: "query" for query parameters or "json" for JSON API
+            no_push: Do not push keys to this vault
         """
         super().__init__(name, no_push)
+        self.log = logging.getLogger(f"HTTP[{name}]")
         self.url = host
         self.password = password
         self.username = username
@@ -37,7 +98,23 @@ class HTTP(Vault):
         self.current_title = None
         self.session = Session()
         self.session.headers.update({"User-Agent": f"unshackle v{__version__}"})
+        adapter = _get_adapter(host)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if self.api_mode == "json":
+            # Request bodies are serialized ourselves, see `request`
+            self.session.headers["Content-Type"] = "application/json"
         self.api_session_id = None
+        # Cleared once the server turns out not to support the batched InsertKeys method
+        self._supports_batch_insert = True
+        # Query params -> (ETag, Last-Modified, decoded body) of list responses, for conditional requests
+        self._validator_cache: dict[tuple, tuple[Optional[str], Optional[str], dict]] = {}
+        self._key_cache: OrderedDict[tuple[str, str], str] = OrderedDict()
+        # (service, KID) pairs the vault answered as having no key for, most recent last
+        self._missing_keys: OrderedDict[tuple[str, str], None] = OrderedDict()
+        self._key_cache_lock = threading.Lock()
+        # (monotonic fetch time, services) of the last successful get_services
+        self._services_cache: Optional[tuple[float, list[str]]] = None
 
         # Validate configuration based on mode
         if self.api_mode == "query" and not self.username:
@@ -45,7 +122,7 @@ class HTTP(Vault):
         elif self.api_mode not in ["query", "json"]:
             raise ValueError("api_mode must be either 'query' or 'json'")
 
-    def request(self, method: str, params: dict = None) -> dict:
+    def request(self, method: str, params: dict = None, timeout: Optional[tuple[float, float]] = None) -> dict:
         """Make a request to the JSON API vault."""
         if self.api_mode != "json":
             raise ValueError("request method is only available in json mode")
@@ -59,7 +136,11 @@ class HTTP(Vault):
             "token": self.password,
         }
 
-        r = self.session.post(self.url, json=request_payload)
+        r = self.session.post(
+            self.url,
+            data=json.dumps(request_payload),
+            timeout=timeout or self.TIMEOUT,
+        )
 
         if r.status_code == 404:
             return {"status": "not_found"}
@@ -82,10 +163,77 @@ class HTTP(Vault):
 
         return res.get("message", res)
 
+    def _conditional_get(self, params: dict) -> dict:
+        """
+        Make a query mode GET request and decode the response.
+
+        Responses carrying an ETag or Last-Modified header are kept, and repeat requests with
+        the same params revalidate them, reusing the decoded body on 304 Not Modified.
+        """
+        cache_key = tuple(sorted(params.items()))
+        cached = self._validator_cache.get(cache_key)
+
+        headers = {}
+        if cached:
+            etag, last_modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        response = self.session.get(self.url, params=params, headers=headers, timeout=self.TIMEOUT)
+        if cached and response.status_code == 304:
+            return cached[2]
+
+        data = response.json()
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            self._validator_cache[cache_key] = (etag, last_modified, data)
+        else:
+            self._validator_cache.pop(cache_key, None)
+
+        return data
+
     def get_key(self, kid: Union[UUID, str], service: str) -> Optional[str]:
         if isinstance(kid, UUID):
             kid = kid.hex
+        # vaults store service tags lowercase
+        service = service.lower()
+
+        cache_key = (service, kid)
+        with self._key_cache_lock:
+            key = self._key_cache.get(cache_key)
+            if key is not None:
+                self._key_cache.move_to_end(cache_key)
+                return key
+            if cache_key in self._missing_keys:
+                return None
 
+        key, answered = self._fetch_key(kid, service)
+
+        # Misses are only remembered when the vault answered, a failed request is tried again next time.
+        # Both are dropped by _forget_key when this vault is given the key.
+        if key is not None or answered:
+            cache = self._key_cache if key is not None else self._missing_keys
+            with self._key_cache_lock:
+                cache[cache_key] = key
+                if len(cache) > self.KEY_CACHE_SIZE:
+                    cache.popitem(last=False)
+
+        return key
+
+    def _forget_key(self, service: str, kid: str) -> None:
+        """Drop cached data an insert of this KID may change, so the vault is asked again. Expects a lowercase service."""
+        with self._key_cache_lock:
+            self._key_cache.pop((service, kid), None)
+            self._missing_keys.pop((service, kid), None)
+        # The insert may add a new service
+        self._services_cache = None
+
+    def _fetch_key(self, kid: str, service: str) -> tuple[Optional[str], bool]:
+        """Ask the vault for the Content Key of a KID, and whether the vault answered at all."""
         if self.api_mode == "json":
             try:
                 title = getattr(self, "current_title", None)
@@ -93,32 +241,40 @@ class HTTP(Vault):
                     "GetKey",
                     {
                         "kid": kid,
-                        "service": service.lower(),
+                        "service": service,
                         "title": title,
                     },
+                    timeout=self.LOOKUP_TIMEOUT,
                 )
                 if response.get("status") == "not_found":
-                    return None
+                    return None, True
                 keys = response.get("keys", [])
                 for key_entry in keys:
                     if key_entry["kid"] == kid:
-                        return key_entry["key"]
+                        return key_entry["key"], True
             except Exception as e:
-                print(f"Failed to get key ({e.__class__.__name__}: {e})")
-                return None
-            return None
+                self.log.debug("Failed to get key (%s: %s)", e.__class__.__name__, e)
+                return None, False
+            return None, True
         else:  # query mode
-            response = self.session.get(
-                self.url,
-                params={"service": service.lower(), "username": self.username, "password": self.password, "kid": kid},
-            )
-
-            data = response.json()
+            try:
+                response = self.session.get(
+                    self.url,
+                    params={"service": service, "username": self.username, "password": self.password, "kid": kid},
+                    timeout=self.LOOKUP_TIMEOUT,
+                )
+                data = response.json()
+            except RequestException as e:
+                # e.g. the short lookup timeout ran out, treat it as unanswered so it's tried again later
+                self.log.debug("Failed to get key (%s: %s)", e.__class__.__name__, e)
+                return None, False
 
-            if data.get("status_code") != 200 or not data.get("keys"):
-                return None
+            if data.get("status_code") != 200:
+                return None, False
+            if not data.get("keys"):
+                return None, True
 
-            return data["keys"][0]["key"]
+            return data["keys"][0]["key"], True
 
     def get_keys(self, service: str) -> Iterator[tuple[str, str]]:
         if self.api_mode == "json":
@@ -126,12 +282,10 @@ class HTTP(Vault):
             # This will cause the copy command to rely on the API's internal duplicate handling
             return iter([])
         else:  # query mode
-            response = self.session.get(
-                self.url, params={"service": service.lower(), "username": self.username, "password": self.password}
+            data = self._conditional_get(
+                {"service": service.lower(), "username": self.username, "password": self.password}
             )
 
-            data = response.json()
-
             if data.get("status_code") != 200 or not data.get("keys"):
                 return
 
@@ -139,12 +293,14 @@ class HTTP(Vault):
                 yield key_entry["kid"], key_entry["key"]
 
     def add_key(self, service: str, kid: Union[UUID, str], key: str) -> bool:
-        if not key or key.count("0") == len(key):
+        if is_null_key(key):
             raise ValueError("You cannot add a NULL Content Key to a Vault.")
 
         if isinstance(kid, UUID):
             kid = kid.hex
+        service = service.lower()
 
+        self._forget_key(service, kid)
         title = getattr(self, "current_title", None)
 
         if self.api_mode == "json":
@@ -154,7 +310,7 @@ class HTTP(Vault):
                     {
                         "kid": kid,
                         "key": key,
-                        "service": service.lower(),
+                        "service": service,
                         "title": title,
                     },
                 )
@@ -167,13 +323,14 @@ class HTTP(Vault):
             response = self.session.get(
                 self.url,
                 params={
-                    "service": service.lower(),
+                    "service": service,
                     "username": self.username,
                     "password": self.password,
                     "kid": kid,
                     "key": key,
                     "title": title,
                 },
+                timeout=self.TIMEOUT,
             )
 
             data = response.json()
@@ -181,78 +338,117 @@ class HTTP(Vault):
             return data.get("status_code") == 200
 
     def add_keys(self, service: str, kid_keys: dict[Union[UUID, str], str]) -> int:
+        processed_kid_keys = {}
         for kid, key in kid_keys.items():
-            if not key or key.count("0") == len(key):
+            if is_null_key(key):
                 raise ValueError("You cannot add a NULL Content Key to a Vault.")
+            processed_kid_keys[kid.hex if isinstance(kid, UUID) else kid] = key
 
-        processed_kid_keys = {
-            str(kid).replace("-", "") if isinstance(kid, UUID) else kid: key for kid, key in kid_keys.items()
-        }
+        service_lower = service.lower()
+        for kid in processed_kid_keys:
+            self._forget_key(service_lower, kid)
 
         inserted_count = 0
         title = getattr(self, "current_title", None)
 
         if self.api_mode == "json":
-            for kid, key in processed_kid_keys.items():
+            if self._supports_batch_insert:
+                try:
+                    response = self.request(
+                        "InsertKeys",
+                        {
+                            "kid_keys": processed_kid_keys,
+                            "service": service_lower,
+                            "title": title,
+                        },
+                    )
+                except Exception as e:
+                    # A transient failure, fall back to one InsertKey request per KID for this call only
+                    self.log.debug("Failed to insert keys in one batch (%s: %s)", e.__class__.__name__, e)
+                    response = None
+                if response is not None and response.get("status") == "not_found":
+                    # The server has no InsertKeys method, use one InsertKey request per KID from now on
+                    self._supports_batch_insert = False
+                elif response is not None and "inserted" in response:
+                    inserted = response["inserted"]
+                    # Either a count, or the per-KID insert status of every key sent
+                    if isinstance(inserted, dict):
+                        return sum(1 for status in inserted.values() if status)
+                    if isinstance(inserted, list):
+                        return sum(1 for status in inserted if status)
+                    return int(inserted)
+                # Without an `inserted` result it's unknown what was stored, so every KID is sent again
+
+            def insert_key(kid: str, key: str) -> bool:
                 try:
                     response = self.request(
                         "InsertKey",
                         {
                             "kid": kid,
                             "key": key,
-                            "service": service.lower(),
+                            "service": service_lower,
                             "title": title,
                         },
                     )
-                    if response.get("status") == "not_found":
-                        continue
-                    if response.get("inserted", False):
-                        inserted_count += 1
                 except Exception:
-                    continue
+                    return False
+                return response.get("status") != "not_found" and bool(response.get("inserted", False))
+
         else:  # query mode
-            for kid, key in processed_kid_keys.items():
+
+            def insert_key(kid: str, key: str) -> bool:
                 response = self.session.get(
                     self.url,
                     params={
-                        "service": service.lower(),
+                        "service": service_lower,
                         "username": self.username,
                         "password": self.password,
                         "kid": kid,
                         "key": key,
                         "title": title,
                     },
+                    timeout=self.TIMEOUT,
                 )
 
                 data = response.json()
 
-                if data.get("status_code") == 200 and data.get("inserted", True):
-                    inserted_count += 1
+                return data.get("status_code") == 200 and bool(data.get("inserted", True))
+
+        if processed_kid_keys:
+            # Every KID is inserted with its own request, overlap their round-trips
+            with ThreadPoolExecutor(max_workers=min(self.MAX_WORKERS, len(processed_kid_keys))) as pool:
+                inserted_count = sum(pool.map(insert_key, processed_kid_keys.keys(), processed_kid_keys.values()))
 
         return inserted_count
 
     def get_services(self) -> Iterator[str]:
+        cached = self._services_cache
+        if cached and time.monotonic() - cached[0] < self.SERVICES_TTL:
+            yield from cached[1]
+            return
+
+        services = self._fetch_services()
+        if services is None:
+            return
+
+        self._services_cache = (time.monotonic(), services)
+        yield from services
+
+    def _fetch_services(self) -> Optional[list[str]]:
+        """Get the Service Tags from the vault, or None if they could not be retrieved."""
         if self.api_mode == "json":
             try:
                 response = self.request("GetServices")
-                services = response.get("services", [])
-                for service in services:
-                    yield service
+                return list(response.get("services", []))
             except Exception:
-                return iter([])
+                return None
         else:  # query mode
-            response = self.session.get(
-                self.url, params={"username": self.username, "password": self.password, "list_services": True}
-            )
-
-            data = response.json()
+            data = self._conditional_get({"username": self.username, "password": self.password, "list_services": True})
 
             if data.get("status_code") != 200:
-                return
+                return None
 
-            services = data.get("services", [])
-            for service in services:
-                yield service
+            return list(data.get("services", []))
 
     def set_title(self, title: str):
         """
@@ -269,12 +465,14 @@ class HTTP(Vault):
         This method provides more granular feedback than the standard add_key method.
         Available in both API modes.
         """
-        if not key or key.count("0") == len(key):
+        if is_null_key(key):
             raise ValueError("You cannot add a NULL Content Key to a Vault.")
 
         if isinstance(kid, UUID):
             kid = kid.hex
+        service = service.lower()
 
+        self._forget_key(service, kid)
         if title is None:
             title = getattr(self, "current_title", None)
 
@@ -285,7 +483,7 @@ class HTTP(Vault):
                     {
                         "kid": kid,
                         "key": key,
-                        "service": service.lower(),
+                        "service": service,
                         "title": title,
                     },
                 )
@@ -304,13 +502,14 @@ class HTTP(Vault):
             response = self.session.get(
                 self.url,
                 params={
-                    "service": service.lower(),
+                    "service": service,
                     "username": self.username,
                     "password": self.password,
                     "kid": kid,
                     "key": key,
                     "title": title,
                 },
+                timeout=self.TIMEOUT,
             )
 
             try:
@@ -1,4 +1,7 @@
+import logging
+import re
 import threading
+from functools import lru_cache
 from typing import Iterator, Optional, Union
 from uuid import UUID
 
@@ -6,24 +9,76 @@ import pymysql
 from pymysql.cursors import DictCursor
 
 from unshackle.core.services import Services
-from unshackle.core.vault import Vault
+from unshackle.core.vault import NULL_KEY, Vault, is_null_key
+
+# Table names can't be bound as query parameters, so service names are checked before being put into SQL
+SERVICE_NAME_RE = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+SQL = {
+    # one branch of the UNION ALL built by _get_key_sql, lower priorities are preferred
+    "get_key": "SELECT `key_`, {{priority}} AS `priority` FROM `{}` WHERE `kid`=%s AND `key_`!=%s",
+    "get_keys": "SELECT `kid`, `key_` FROM `{}` WHERE `key_`!=%s",
+    "get_kids": "SELECT `kid` FROM `{}` WHERE `kid` IN ({{kids}})",
+    "insert": "INSERT IGNORE INTO `{}` (kid, key_) VALUES (%s, %s)",
+    "create_table": """
+        CREATE TABLE IF NOT EXISTS `{}` (
+          id          int AUTO_INCREMENT PRIMARY KEY,
+          kid         VARCHAR(64) NOT NULL,
+          key_        VARCHAR(64) NOT NULL,
+          UNIQUE(kid, key_)
+        );
+    """,
+}
+
+
+@lru_cache(maxsize=256)
+def _sql_for(service: str, op: str) -> str:
+    """Get the SQL statement of an operation on a service's table."""
+    if not SERVICE_NAME_RE.fullmatch(service):
+        raise ValueError(f"Service name {service!r} is not a valid vault table name.")
+    return SQL[op].format(service)
+
+
+@lru_cache(maxsize=256)
+def _get_key_sql(services: tuple[str, ...]) -> str:
+    """Get the SQL statement looking up a KID in several services' tables, preferring the earlier tables."""
+    return (
+        " UNION ALL ".join(
+            _sql_for(service, "get_key").format(priority=priority) for priority, service in enumerate(services)
+        )
+        + " ORDER BY `priority` LIMIT 1"
+    )
 
 
 class MySQL(Vault):
     """Key Vault using a remotely-accessed mysql database connection."""
 
+    # Each worker thread reads through its own connection from the ConnectionFactory
+    READ_WORKERS = 8
+    # KIDs checked per query by add_keys, keeping the IN (...) list and its packet small
+    KID_BATCH_SIZE = 500
+
     def __init__(self, name: str, host: str, database: str, username: str, no_push: bool = False, **kwargs):
         """
         All extra arguments provided via **kwargs will be sent to pymysql.connect.
         This can be used to provide more specific connection information.
         """
         super().__init__(name, no_push)
+        self.log = logging.getLogger(f"MySQL[{name}]")
         self.slug = f"{host}:{database}:{username}"
         self.conn_factory = ConnectionFactory(
             dict(host=host, db=database, user=username, cursorclass=DictCursor, **kwargs)
         )
+        # Tables known to exist; tables are never dropped, so only found tables are remembered
+        self._tables: set[str] = set()
+        self._permission_cache: dict[tuple[str, Optional[str], Optional[str]], bool] = {}
 
         self.permissions = self.get_permissions()
+        # Grant locations indexed by operation, "*" holding the locations with all privileges
+        self._grant_locations: dict[str, list[list[str]]] = {}
+        for perms, location in self.permissions:
+            for perm in ["*"] if perms == ["*"] else perms:
+                self._grant_locations.setdefault(perm, []).append(location)
         if not self.has_permission("SELECT"):
             raise PermissionError(f"MySQL vault {self.slug} has no SELECT permission.")
 
@@ -37,48 +92,39 @@ class MySQL(Vault):
         if service != service.upper():
             service_variants.append(service.upper())
 
-        conn = self.conn_factory.get()
-        cursor = conn.cursor()
-
-        try:
-            for service_name in service_variants:
-                if not self.has_table(service_name):
-                    continue
-
-                cursor.execute(
-                    # TODO: SQL injection risk
-                    f"SELECT `id`, `key_` FROM `{service_name}` WHERE `kid`=%s AND `key_`!=%s",
-                    (kid, "0" * 32),
-                )
-                cek = cursor.fetchone()
-                if cek:
-                    return cek["key_"]
-
+        # tables with names that can't be put into SQL safely are never read
+        found = self.has_tables([name for name in service_variants if SERVICE_NAME_RE.fullmatch(name)])
+        if not found:
             return None
-        finally:
-            cursor.close()
+
+        # every variant's table is searched in one statement, the first variant with a key wins
+        tables = tuple(name for name in service_variants if name in found)
+        cursor = self.conn_factory.cursor()
+        cursor.execute(_get_key_sql(tables), (kid, NULL_KEY) * len(tables))
+        cek = cursor.fetchone()
+        return cek["key_"] if cek else None
 
     def get_keys(self, service: str) -> Iterator[tuple[str, str]]:
         if not self.has_table(service):
             # no table, no keys, simple
             return None
+        if not SERVICE_NAME_RE.fullmatch(service):
+            # a table made outside of unshackle, it can't be read safely so don't stop a whole copy over it
+            self.log.warning(f"Skipping table {service!r}, it is not a valid service name")
+            return None
 
-        conn = self.conn_factory.get()
-        cursor = conn.cursor()
+        cursor = self.conn_factory.cursor()
 
-        try:
-            cursor.execute(
-                # TODO: SQL injection risk
-                f"SELECT `kid`, `key_` FROM `{service}` WHERE `key_`!=%s",
-                ("0" * 32,),
-            )
-            for row in cursor.fetchall():
-                yield row["kid"], row["key_"]
-        finally:
-            cursor.close()
+        # every row is fetched before yielding, callers may query this connection while iterating
+        cursor.execute(
+            _sql_for(service, "get_keys"),
+            (NULL_KEY,),
+        )
+        for row in cursor.fetchall():
+            yield row["kid"], row["key_"]
 
     def add_key(self, service: str, kid: Union[UUID, str], key: str) -> bool:
-        if not key or key.count("0") == len(key):
+        if is_null_key(key):
             raise ValueError("You cannot add a NULL Content Key to a Vault.")
 
         if not self.has_permission("INSERT", table=service):
@@ -94,32 +140,34 @@ class MySQL(Vault):
             kid = kid.hex
 
         conn = self.conn_factory.get()
-        cursor = conn.cursor()
+        cursor = self.conn_factory.cursor()
 
         try:
             cursor.execute(
-                # TODO: SQL injection risk
-                f"SELECT `id` FROM `{service}` WHERE `kid`=%s AND `key_`=%s",
-                (kid, key),
-            )
-            if cursor.fetchone():
-                # table already has this exact KID:KEY stored
-                return True
-            cursor.execute(
-                # TODO: SQL injection risk
-                f"INSERT INTO `{service}` (kid, key_) VALUES (%s, %s)",
+                # an exact KID:KEY already stored is ignored by the UNIQUE(kid, key_) constraint
+                _sql_for(service, "insert"),
                 (kid, key),
             )
         finally:
             conn.commit()
-            cursor.close()
 
         return True
 
     def add_keys(self, service: str, kid_keys: dict[Union[UUID, str], str]) -> int:
+        if not isinstance(kid_keys, dict):
+            raise ValueError(f"The kid_keys provided is not a dictionary, {kid_keys!r}")
+
+        # validate and normalize every KID:KEY in a single pass
+        processed: dict[str, str] = {}
         for kid, key in kid_keys.items():
-            if not key or key.count("0") == len(key):
+            if not isinstance(key, str) or not isinstance(kid, (str, UUID)):
+                raise ValueError("Expecting dict with Key of str/UUID and value of str.")
+            if is_null_key(key):
                 raise ValueError("You cannot add a NULL Content Key to a Vault.")
+            processed[kid.hex if isinstance(kid, UUID) else kid] = key
+
+        if not processed:
+            return 0
 
         if not self.has_permission("INSERT", table=service):
             raise PermissionError(f"MySQL vault {self.slug} has no INSERT permission.")
@@ -130,64 +178,78 @@ class MySQL(Vault):
             except PermissionError:
                 return 0
 
-        if not isinstance(kid_keys, dict):
-            raise ValueError(f"The kid_keys provided is not a dictionary, {kid_keys!r}")
-        if not all(isinstance(kid, (str, UUID)) and isinstance(key_, str) for kid, key_ in kid_keys.items()):
-            raise ValueError("Expecting dict with Key of str/UUID and value of str.")
-
-        if any(isinstance(kid, UUID) for kid, key_ in kid_keys.items()):
-            kid_keys = {kid.hex if isinstance(kid, UUID) else kid: key_ for kid, key_ in kid_keys.items()}
-
-        if not kid_keys:
-            return 0
-
         conn = self.conn_factory.get()
-        cursor = conn.cursor()
+        cursor = self.conn_factory.cursor()
 
         try:
-            placeholders = ",".join(["%s"] * len(kid_keys))
-            cursor.execute(f"SELECT kid FROM `{service}` WHERE kid IN ({placeholders})", list(kid_keys.keys()))
-            existing_kids = {row["kid"] for row in cursor.fetchall()}
-
-            new_keys = {kid: key for kid, key in kid_keys.items() if kid not in existing_kids}
-
+            # KIDs already stored are skipped, even if their stored key differs
+            existing = set()
+            kids = list(processed)
+            for i in range(0, len(kids), self.KID_BATCH_SIZE):
+                batch = kids[i : i + self.KID_BATCH_SIZE]
+                cursor.execute(_sql_for(service, "get_kids").format(kids=",".join(["%s"] * len(batch))), batch)
+                existing.update(row["kid"].lower() for row in cursor.fetchall())
+            new_keys = [(kid, key) for kid, key in processed.items() if kid.lower() not in existing]
             if not new_keys:
                 return 0
 
-            cursor.executemany(
-                f"INSERT INTO `{service}` (kid, key_) VALUES (%s, %s)",
-                new_keys.items(),
-            )
-            return len(new_keys)
+            cursor.executemany(_sql_for(service, "insert"), new_keys)
+            return cursor.rowcount
         finally:
             conn.commit()
-            cursor.close()
 
     def get_services(self) -> Iterator[str]:
         conn = self.conn_factory.get()
-        cursor = conn.cursor()
+        cursor = self.conn_factory.cursor()
 
-        try:
-            cursor.execute("SHOW TABLES")
-            for table in cursor.fetchall():
-                # each entry has a key named `Tables_in_<db name>`
-                yield Services.get_tag(list(table.values())[0])
-        finally:
-            cursor.close()
+        cursor.execute("SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA=%s", (conn.db,))
+        # read every name before yielding, callers query this connection while iterating the services
+        for row in cursor.fetchall():
+            name = row["TABLE_NAME"]
+            if not SERVICE_NAME_RE.fullmatch(name):
+                self.log.warning(f"Skipping table {name!r}, it is not a valid service name")
+                continue
+            yield Services.get_tag(name)
 
     def has_table(self, name: str) -> bool:
         """Check if the Vault has a Table with the specified name."""
+        if name in self._tables:
+            return True
+
         conn = self.conn_factory.get()
-        cursor = conn.cursor()
+        cursor = self.conn_factory.cursor()
 
-        try:
-            cursor.execute(
-                "SELECT count(TABLE_NAME) FROM information_schema.TABLES WHERE TABLE_SCHEMA=%s AND TABLE_NAME=%s",
-                (conn.db, name),
-            )
-            return list(cursor.fetchone().values())[0] == 1
-        finally:
-            cursor.close()
+        cursor.execute(
+            "SELECT count(TABLE_NAME) FROM information_schema.TABLES WHERE TABLE_SCHEMA=%s AND TABLE_NAME=%s",
+            (conn.db, name),
+        )
+        exists = list(cursor.fetchone().values())[0] == 1
+
+        if exists:
+            self._tables.add(name)
+        return exists
+
+    def has_tables(self, names: list[str]) -> set[str]:
+        """Get which of the specified Table names the Vault has, checking unknown names in one query."""
+        found = {name for name in names if name in self._tables}
+        unknown = [name for name in names if name not in found]
+        if not unknown:
+            return found
+
+        conn = self.conn_factory.get()
+        cursor = self.conn_factory.cursor()
+
+        cursor.execute(
+            "SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA=%s AND TABLE_NAME IN ({})".format(
+                ",".join(["%s"] * len(unknown))
+            ),
+            (conn.db, *unknown),
+        )
+        # information_schema compares names case-insensitively on some platforms, keep only exact matches
+        exists = {name for row in cursor.fetchall() for name in row.values()}.intersection(unknown)
+
+        self._tables.update(exists)
+        return found | exists
 
     def create_table(self, name: str):
         """Create a Table with the specified name if not yet created."""
@@ -198,54 +260,51 @@ class MySQL(Vault):
             raise PermissionError(f"MySQL vault {self.slug} has no CREATE permission.")
 
         conn = self.conn_factory.get()
-        cursor = conn.cursor()
+        cursor = self.conn_factory.cursor()
 
         try:
-            cursor.execute(
-                # TODO: SQL injection risk
-                f"""
-                CREATE TABLE IF NOT EXISTS {name} (
-                  id          int AUTO_INCREMENT PRIMARY KEY,
-                  kid         VARCHAR(64) NOT NULL,
-                  key_        VARCHAR(64) NOT NULL,
-                  UNIQUE(kid, key_)
-                );
-                """
-            )
+            cursor.execute(_sql_for(name, "create_table"))
         finally:
             conn.commit()
-            cursor.close()
+
+        self._tables.add(name)
 
     def get_permissions(self) -> list:
         """Get and parse Grants to a more easily usable list tuple array."""
         conn = self.conn_factory.get()
-        cursor = conn.cursor()
+        cursor = self.conn_factory.cursor()
 
         try:
             cursor.execute("SHOW GRANTS")
-            grants = cursor.fetchall()
-            grants = [next(iter(x.values())) for x in grants]
-            grants = [tuple(x[6:].split(" TO ")[0].split(" ON ")) for x in list(grants)]
-            grants = [
-                (
-                    list(map(str.strip, perms.replace("ALL PRIVILEGES", "*").split(","))),
-                    location.replace("`", "").split("."),
+            grants = []
+            for row in cursor.fetchall():
+                # e.g. "GRANT SELECT, INSERT ON `db`.* TO `user`@`%`"
+                perms, location = next(iter(row.values()))[6:].split(" TO ")[0].split(" ON ")
+                grants.append(
+                    (
+                        [perm.strip() for perm in perms.replace("ALL PRIVILEGES", "*").split(",")],
+                        location.replace("`", "").split("."),
+                    )
                 )
-                for perms, location in grants
-            ]
             return grants
         finally:
             conn.commit()
-            cursor.close()
 
     def has_permission(self, operation: str, database: Optional[str] = None, table: Optional[str] = None) -> bool:
         """Check if the current connection has a specific permission."""
-        grants = [x for x in self.permissions if x[0] == ["*"] or operation.upper() in x[0]]
-        if grants and database:
-            grants = [x for x in grants if x[1][0] in (database, "*")]
-        if grants and table:
-            grants = [x for x in grants if x[1][1] in (table, "*")]
-        return bool(grants)
+        cache_key = (operation.upper(), database, table)
+        if cache_key in self._permission_cache:
+            return self._permission_cache[cache_key]
+
+        locations = self._grant_locations.get(cache_key[0], []) + self._grant_locations.get("*", [])
+        allowed = any(
+            (not database or location[0] in (database, "*")) and (not table or location[1] in (table, "*"))
+            for location in locations
+        )
+
+        # Grants are read once in __init__, so the answer can't change
+        self._permission_cache[cache_key] = allowed
+        return allowed
 
 
 class ConnectionFactory:
@@ -260,3 +319,9 @@ class ConnectionFactory:
         if not hasattr(self._store, "conn"):
             self._store.conn = self._create_connection()
         return self._store.conn
+
+    def cursor(self) -> DictCursor:
+        """Get this thread's reusable cursor, for statements whose results are fully read before the next one."""
+        if not hasattr(self._store, "cursor"):
+            self._store.cursor = self.get().cursor()
+        return self._store.cursor
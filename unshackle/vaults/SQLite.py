@@ -1,30 +1,77 @@
+import logging
+import re
 import sqlite3
 import threading
+from functools import lru_cache
 from pathlib import Path
 from sqlite3 import Connection
 from typing import Iterator, Optional, Union
 from uuid import UUID
 
 from unshackle.core.services import Services
-from unshackle.core.vault import Vault
+from unshackle.core.vault import NULL_KEY, Vault, is_null_key
+
+# Table names can't be bound as query parameters, so service names are checked before being put into SQL
+SERVICE_NAME_RE = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+SQL = {
+    # one branch of the UNION ALL built by _get_key_sql, lower priorities are preferred
+    "get_key": "SELECT `key_`, {{priority}} AS `priority` FROM `{}` WHERE `kid`=? AND `key_`!=?",
+    "get_keys": "SELECT `kid`, `key_` FROM `{}` WHERE `key_`!=?",
+    "get_kids": "SELECT `kid` FROM `{}` WHERE `kid` IN ({{kids}})",
+    "insert": "INSERT OR IGNORE INTO `{}` (kid, key_) VALUES (?, ?)",
+    "create_table": """
+        CREATE TABLE IF NOT EXISTS `{}` (
+          "id"        INTEGER NOT NULL UNIQUE,
+          "kid"       TEXT NOT NULL COLLATE NOCASE,
+          "key_"      TEXT NOT NULL COLLATE NOCASE,
+          PRIMARY KEY("id" AUTOINCREMENT),
+          UNIQUE("kid", "key_")
+        );
+    """,
+}
+
+
+@lru_cache(maxsize=256)
+def _sql_for(service: str, op: str) -> str:
+    """Get the SQL statement of an operation on a service's table."""
+    if not SERVICE_NAME_RE.fullmatch(service):
+        raise ValueError(f"Service name {service!r} is not a valid vault table name.")
+    return SQL[op].format(service)
+
+
+@lru_cache(maxsize=256)
+def _get_key_sql(services: tuple[str, ...]) -> str:
+    """Get the SQL statement looking up a KID in several services' tables, preferring the earlier tables."""
+    return (
+        " UNION ALL ".join(
+            _sql_for(service, "get_key").format(priority=priority) for priority, service in enumerate(services)
+        )
+        + " ORDER BY `priority` LIMIT 1"
+    )
 
 
 class SQLite(Vault):
     """Key Vault using a locally-accessed sqlite DB file."""
 
+    # Each worker thread reads through its own connection from the ConnectionFactory
+    READ_WORKERS = 8
+    # KIDs checked per query by add_keys, below SQLite's default limit of 999 bound parameters
+    KID_BATCH_SIZE = 500
+
     def __init__(self, name: str, path: Union[str, Path], no_push: bool = False):
         super().__init__(name, no_push)
+        self.log = logging.getLogger(f"SQLite[{name}]")
         self.path = Path(path).expanduser()
         # TODO: Use a DictCursor or such to get fetches as dict?
         self.conn_factory = ConnectionFactory(self.path)
+        # Tables known to exist; tables are never dropped, so only found tables are remembered
+        self._tables: set[str] = set()
 
     def get_key(self, kid: Union[UUID, str], service: str) -> Optional[str]:
         if isinstance(kid, UUID):
             kid = kid.hex
 
-        conn = self.conn_factory.get()
-        cursor = conn.cursor()
-
         # Try both the original service name and lowercase version to handle case sensitivity issues
         service_variants = [service]
         if service != service.lower():
@@ -32,37 +79,34 @@ class SQLite(Vault):
         if service != service.upper():
             service_variants.append(service.upper())
 
-        try:
-            for service_name in service_variants:
-                if not self.has_table(service_name):
-                    continue
-
-                cursor.execute(f"SELECT `id`, `key_` FROM `{service_name}` WHERE `kid`=? AND `key_`!=?", (kid, "0" * 32))
-                cek = cursor.fetchone()
-                if cek:
-                    return cek[1]
-
+        # tables with names that can't be put into SQL safely are never read
+        tables = tuple(name for name in service_variants if SERVICE_NAME_RE.fullmatch(name) and self.has_table(name))
+        if not tables:
             return None
-        finally:
-            cursor.close()
+
+        # every variant's table is searched in one statement, the first variant with a key wins
+        cursor = self.conn_factory.cursor()
+        cursor.execute(_get_key_sql(tables), (kid, NULL_KEY) * len(tables))
+        cek = cursor.fetchone()
+        return cek[0] if cek else None
 
     def get_keys(self, service: str) -> Iterator[tuple[str, str]]:
         if not self.has_table(service):
             # no table, no keys, simple
             return None
+        if not SERVICE_NAME_RE.fullmatch(service):
+            # a table made outside of unshackle, it can't be read safely so don't stop a whole copy over it
+            self.log.warning(f"Skipping table {service!r}, it is not a valid service name")
+            return None
 
-        conn = self.conn_factory.get()
-        cursor = conn.cursor()
+        cursor = self.conn_factory.cursor()
 
-        try:
-            cursor.execute(f"SELECT `kid`, `key_` FROM `{service}` WHERE `key_`!=?", ("0" * 32,))
-            for kid, key_ in cursor.fetchall():
-                yield kid, key_
-        finally:
-            cursor.close()
+        # every row is fetched before yielding, callers may query this connection while iterating
+        cursor.execute(_sql_for(service, "get_keys"), (NULL_KEY,))
+        yield from cursor.fetchall()
 
     def add_key(self, service: str, kid: Union[UUID, str], key: str) -> bool:
-        if not key or key.count("0") == len(key):
+        if is_null_key(key):
             raise ValueError("You cannot add a NULL Content Key to a Vault.")
 
         if not self.has_table(service):
@@ -72,91 +116,88 @@ class SQLite(Vault):
             kid = kid.hex
 
         conn = self.conn_factory.get()
-        cursor = conn.cursor()
+        cursor = self.conn_factory.cursor()
 
         try:
             cursor.execute(
-                # TODO: SQL injection risk
-                f"SELECT `id` FROM `{service}` WHERE `kid`=? AND `key_`=?",
-                (kid, key),
-            )
-            if cursor.fetchone():
-                # table already has this exact KID:KEY stored
-                return True
-            cursor.execute(
-                # TODO: SQL injection risk
-                f"INSERT INTO `{service}` (kid, key_) VALUES (?, ?)",
+                # an exact KID:KEY already stored is ignored by the UNIQUE(kid, key_) constraint
+                _sql_for(service, "insert"),
                 (kid, key),
             )
         finally:
             conn.commit()
-            cursor.close()
 
         return True
 
     def add_keys(self, service: str, kid_keys: dict[Union[UUID, str], str]) -> int:
-        for kid, key in kid_keys.items():
-            if not key or key.count("0") == len(key):
-                raise ValueError("You cannot add a NULL Content Key to a Vault.")
-
-        if not self.has_table(service):
-            self.create_table(service)
-
         if not isinstance(kid_keys, dict):
             raise ValueError(f"The kid_keys provided is not a dictionary, {kid_keys!r}")
-        if not all(isinstance(kid, (str, UUID)) and isinstance(key_, str) for kid, key_ in kid_keys.items()):
-            raise ValueError("Expecting dict with Key of str/UUID and value of str.")
 
-        if any(isinstance(kid, UUID) for kid, key_ in kid_keys.items()):
-            kid_keys = {kid.hex if isinstance(kid, UUID) else kid: key_ for kid, key_ in kid_keys.items()}
+        # validate and normalize every KID:KEY in a single pass
+        processed: dict[str, str] = {}
+        for kid, key in kid_keys.items():
+            if not isinstance(key, str) or not isinstance(kid, (str, UUID)):
+                raise ValueError("Expecting dict with Key of str/UUID and value of str.")
+            if is_null_key(key):
+                raise ValueError("You cannot add a NULL Content Key to a Vault.")
+            processed[kid.hex if isinstance(kid, UUID) else kid] = key
 
-        if not kid_keys:
+        if not processed:
             return 0
 
+        if not self.has_table(service):
+            self.create_table(service)
+
         conn = self.conn_factory.get()
-        cursor = conn.cursor()
+        cursor = self.conn_factory.cursor()
 
         try:
-            placeholders = ",".join(["?"] * len(kid_keys))
-            cursor.execute(f"SELECT kid FROM `{service}` WHERE kid IN ({placeholders})", list(kid_keys.keys()))
-            existing_kids = {row[0] for row in cursor.fetchall()}
-
-            new_keys = {kid: key for kid, key in kid_keys.items() if kid not in existing_kids}
-
+            if not conn.in_transaction:
+                # take the write lock up front so the whole batch lands in one transaction and one commit,
+                # rather than a deferred transaction that can fail with SQLITE_BUSY when upgrading to write
+                conn.execute("BEGIN IMMEDIATE")
+            # KIDs already stored are skipped, even if their stored key differs
+            existing = set()
+            kids = list(processed)
+            for i in range(0, len(kids), self.KID_BATCH_SIZE):
+                batch = kids[i : i + self.KID_BATCH_SIZE]
+                cursor.execute(_sql_for(service, "get_kids").format(kids=",".join(["?"] * len(batch))), batch)
+                existing.update(kid.lower() for (kid,) in cursor.fetchall())
+            new_keys = [(kid, key) for kid, key in processed.items() if kid.lower() not in existing]
             if not new_keys:
                 return 0
 
-            cursor.executemany(
-                f"INSERT INTO `{service}` (kid, key_) VALUES (?, ?)",
-                new_keys.items(),
-            )
-            return len(new_keys)
+            changes = conn.total_changes
+            cursor.executemany(_sql_for(service, "insert"), new_keys)
+            return conn.total_changes - changes
         finally:
             conn.commit()
-            cursor.close()
 
     def get_services(self) -> Iterator[str]:
-        conn = self.conn_factory.get()
-        cursor = conn.cursor()
+        cursor = self.conn_factory.cursor()
 
-        try:
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            for (name,) in cursor.fetchall():
-                if name != "sqlite_sequence":
-                    yield Services.get_tag(name)
-        finally:
-            cursor.close()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+        for (name,) in cursor.fetchall():
+            if name == "sqlite_sequence":
+                continue
+            if not SERVICE_NAME_RE.fullmatch(name):
+                self.log.warning(f"Skipping table {name!r}, it is not a valid service name")
+                continue
+            yield Services.get_tag(name)
 
     def has_table(self, name: str) -> bool:
         """Check if the Vault has a Table with the specified name."""
-        conn = self.conn_factory.get()
-        cursor = conn.cursor()
+        if name in self._tables:
+            return True
 
-        try:
-            cursor.execute("SELECT count(name) FROM sqlite_master WHERE type='table' AND name=?", (name,))
-            return cursor.fetchone()[0] == 1
-        finally:
-            cursor.close()
+        cursor = self.conn_factory.cursor()
+
+        cursor.execute("SELECT count(name) FROM sqlite_master WHERE type='table' AND name=?", (name,))
+        exists = cursor.fetchone()[0] == 1
+
+        if exists:
+            self._tables.add(name)
+        return exists
 
     def create_table(self, name: str):
         """Create a Table with the specified name if not yet created."""
@@ -164,24 +205,14 @@ class SQLite(Vault):
             return
 
         conn = self.conn_factory.get()
-        cursor = conn.cursor()
+        cursor = self.conn_factory.cursor()
 
         try:
-            cursor.execute(
-                # TODO: SQL injection risk
-                f"""
-                CREATE TABLE IF NOT EXISTS {name} (
-                  "id"        INTEGER NOT NULL UNIQUE,
-                  "kid"       TEXT NOT NULL COLLATE NOCASE,
-                  "key_"      TEXT NOT NULL COLLATE NOCASE,
-                  PRIMARY KEY("id" AUTOINCREMENT),
-                  UNIQUE("kid", "key_")
-                );
-                """
-            )
+            cursor.execute(_sql_for(name, "create_table"))
         finally:
             conn.commit()
-            cursor.close()
+
+        self._tables.add(name)
 
 
 class ConnectionFactory:
@@ -190,9 +221,22 @@ class ConnectionFactory:
         self._store = threading.local()
 
     def _create_connection(self) -> Connection:
-        return sqlite3.connect(self._path)
+        # sqlite3 keeps prepared statements per connection, keyed by SQL text
+        conn = sqlite3.connect(self._path, cached_statements=256)
+        # WAL lets readers run alongside a writer, and NORMAL syncing is still safe with it
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-65536")  # 64 MiB
+        return conn
 
     def get(self) -> Connection:
         if not hasattr(self._store, "conn"):
             self._store.conn = self._create_connection()
         return self._store.conn
+
+    def cursor(self) -> sqlite3.Cursor:
+        """Get this thread's reusable cursor, for statements whose results are fully read before the next one."""
+        if not hasattr(self._store, "cursor"):
+            self._store.cursor = self.get().cursor()
+        return self._store.cursor